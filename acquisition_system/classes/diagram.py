@@ -1,119 +1,137 @@
-import matplotlib.pyplot as plt
 import os
+import random
+import numpy as np
 from utils import get_color_for_id
+from matplotlib.figure import Figure
 from matplotlib.gridspec import GridSpec
+from matplotlib.lines import Line2D
 
-class Diagram: 
-    def __init__(self):
-        self.points = {} # Dictionary to store points grouped by set IDs
+class Diagram:
+    def __init__(self, max_points = None, decimation = 'reservoir', capacity = 1024, seed = 0):
+        # Points of every set in growable columns (x, inverted y) and (set ID). With 'max_points', at most that many points are kept:
+        # a uniform random sample of all the points ('reservoir') or one point per set and grid cell, with a grid that gets coarser as needed ('grid')
+        if decimation not in ('reservoir', 'grid'):
+            raise ValueError(f"Unknown diagram decimation '{decimation}' (use 'reservoir' or 'grid').")
+        if max_points is not None and max_points < 2:
+            raise ValueError("Value of 'max_points' must be greater than or equal to 2.")
+        self.points = np.empty((capacity, 2), dtype=np.float32) # Points (x, -y) of all sets
+        self.sets = np.empty(capacity, dtype=np.int64) # Set ID of each point
+        self.count = 0 # Number of points kept
+        self.seen = 0 # Number of points added (kept or not)
+        self.order = {} # Order in which the sets appeared (order of the legend)
         self.angles = {} # Dictionary to store angles for each set of valid sequences
+        self.max_points = max_points
+        self.decimation = decimation
+        self.cell = 1.0 # Size (pixels) of the cells of the 'grid' decimation
+        self.rng = random.Random(seed) # Own generator of the 'reservoir' decimation
 
 
     def add_point(self, set, box):
         # Add a single point (bounding box) to a specific set
-        if set not in self.points:
-            self.points[set] = []
-        self.points[set].append([box[0], -box[1]])
+        self.order.setdefault(set, len(self.order))
+        self.seen += 1
+        i = self.count
+        if self.max_points is not None and self.count >= self.max_points:
+            if self.decimation == 'reservoir':
+                i = self.rng.randrange(self.seen) # Keep the new point with probability max_points / seen, replacing a random one
+                if i >= self.max_points:
+                    return
+            else:
+                if self.cell >= 65536: # No coarser grid fits (e.g. more sets than half of 'max_points')
+                    return
+                self.decimate()
+                i = self.count
+        if i == self.count:
+            if self.count == len(self.sets):
+                self.points = np.concatenate((self.points, np.empty_like(self.points)))
+                self.sets = np.concatenate((self.sets, np.empty_like(self.sets)))
+            self.count += 1
+        self.points[i, 0] = box[0]
+        self.points[i, 1] = -box[1]
+        self.sets[i] = set
 
 
     def add_set(self, set, boxes, angle):
         # Add multiple points (bounding boxes) and an angle to a specific set
-        if set not in self.points:
-            self.points[set] = []
         for box in boxes:
-            self.points[set].append([box[0], -box[1]])
+            self.add_point(set, box)
         if set not in self.angles:
             self.angles[set] = []
         self.angles[set].append(angle)
-        
 
-    def save_diagram(self, all_data, max_height, max_width, output_path):
-        # Configure the main plot
-        fig, ax = plt.subplots(figsize=(12, 8))
-        points_set_0 = self.points.pop(0, [])  # Separate points for set 0 (special moments)
-        
-        # Plot points for each set
-        for (set, points) in self.points.items():
-            x = [p[0] for p in points]  # X-coordinates
-            y = [p[1] for p in points]  # Inverted Y-coordinates
-            color = get_color_for_id(set)  # Get a unique color for the set ID
-            if all_data:
-                ax.scatter(x, y, label=set, color=tuple(c / 255.0 for c in color))  # Plot all data points
-            else:
-                angles_set = self.angles[set]
-                angles_string = ", ".join(map(str, angles_set))  # Format angles as a string
-                ax.scatter(x, y, label=f"{set}: {angles_string}", color=tuple(c / 255.0 for c in color))  # Plot filtered points with angles
-        
-        # Plot points for set 0 (black)
-        if points_set_0:
-            x = [p[0] for p in points_set_0]
-            y = [p[1] for p in points_set_0]
-            ax.scatter(x, y, label=0, color='black')
-        
-        # Set plot limits, labels, and title
-        ax.set_xlim(0, max_width)
-        ax.set_ylim(-max_height, 0)
-        ax.set_xlabel('Coordinate X')
-        ax.set_ylabel('Inverted Coordinate Y')
-        if all_data:
-            ax.set_title('Trajectory Plot of All Data Points by ID')
-        else:
-            ax.set_title('Trajectory Plot of Valid Data Points by ID and Respective Angles')
-        ax.grid(True)
 
-        # Create a separate legend figure
-        handles, labels = ax.get_legend_handles_labels()  # Get legend handles and labels
+    def decimate(self):
+        # Keep only the first point of each set in each grid cell, doubling the cell size until at most half of 'max_points' are left
+        while True:
+            keys = np.column_stack((self.sets[:self.count], np.floor(self.points[:self.count] / self.cell)))
+            keep = np.sort(np.unique(keys, axis=0, return_index=True)[1])
+            self.points[:len(keep)] = self.points[keep]
+            self.sets[:len(keep)] = self.sets[keep]
+            self.count = len(keep)
+            if self.count <= self.max_points // 2 or self.cell >= 65536:
+                return
+            self.cell *= 2
+
+
+    def snapshot(self):
+        # Copy of the current points, sets and angles, which can be rendered while new points are added
+        return self.points[:self.count].copy(), self.sets[:self.count].copy(), dict(self.order), {set: list(angles) for set, angles in self.angles.items()}
+
+
+    def render(self, snapshot, all_data, max_height, max_width, output_path):
+        # Render a snapshot as one scatter of every point, with a legend by set (set 0, the special moments, in black and on top).
+        # The figure is not registered in pyplot, so it is freed with the object and can be rendered on any thread
+        points, sets, order, angles = snapshot
+        present = np.unique(sets)
+        ids = sorted(present.tolist(), key=lambda set: (set == 0, order[set]))
+        rank = np.empty(len(present), dtype=np.int64)
+        rank[np.searchsorted(present, ids)] = np.arange(len(ids))
+        point_rank = rank[np.searchsorted(present, sets)] # Position of the set of each point in the legend
+        draw_order = np.argsort(point_rank, kind='stable') # Sets are drawn in legend order
+        colors = np.array([(0, 0, 0) if set == 0 else get_color_for_id(set) for set in ids], dtype=np.float64).reshape(-1, 3) / 255.0
 
         # Create a combined layout
         if all_data:
-            combined_fig = plt.figure(figsize=(16, 8))
-        else:
-            combined_fig = plt.figure(figsize=(16, 16))
-        
-        if all_data:
+            figure = Figure(figsize=(16, 8))
             # Place the legend to the right of the plot
-            gs = GridSpec(1, 2, width_ratios=[3, 1], figure=combined_fig)
-            main_ax = combined_fig.add_subplot(gs[0, 0])  # Plot area
-            legend_ax = combined_fig.add_subplot(gs[0, 1])  # Legend area
+            gs = GridSpec(1, 2, width_ratios=[3, 1], figure=figure)
+            main_ax = figure.add_subplot(gs[0, 0])  # Plot area
+            legend_ax = figure.add_subplot(gs[0, 1])  # Legend area
         else:
+            figure = Figure(figsize=(16, 16))
             # Place the legend below the plot
-            gs = GridSpec(2, 1, height_ratios=[3, 1], figure=combined_fig)
-            main_ax = combined_fig.add_subplot(gs[0, 0])  # Plot area
-            legend_ax = combined_fig.add_subplot(gs[1, 0])  # Legend area
-
-        # Recreate the main plot
-        for (set, points) in self.points.items():
-            x = [p[0] for p in points]
-            y = [p[1] for p in points]
-            color = get_color_for_id(set)
-            if all_data:
-                main_ax.scatter(x, y, label=set, color=tuple(c / 255.0 for c in color))
-            else:
-                angles_set = self.angles[set]
-                angles_string = ", ".join(map(str, angles_set))
-                main_ax.scatter(x, y, label=f"{set}: {angles_string}", color=tuple(c / 255.0 for c in color))
-        
-        if points_set_0:
-            x = [p[0] for p in points_set_0]
-            y = [p[1] for p in points_set_0]
-            main_ax.scatter(x, y, label=0, color='black')
-
-        # Configure main_ax settings
+            gs = GridSpec(2, 1, height_ratios=[3, 1], figure=figure)
+            main_ax = figure.add_subplot(gs[0, 0])  # Plot area
+            legend_ax = figure.add_subplot(gs[1, 0])  # Legend area
+
+        # Plot the points of every set in a single call
+        if len(points):
+            main_ax.scatter(points[draw_order, 0], points[draw_order, 1], c=colors[point_rank[draw_order]])
+
+        # Set plot limits, labels, and title
         main_ax.set_xlim(0, max_width)
         main_ax.set_ylim(-max_height, 0)
         main_ax.set_xlabel('Coordinate X')
         main_ax.set_ylabel('Inverted Coordinate Y')
-        main_ax.set_title(ax.get_title())
+        if all_data:
+            main_ax.set_title('Trajectory Plot of All Data Points by ID')
+        else:
+            main_ax.set_title('Trajectory Plot of Valid Data Points by ID and Respective Angles')
         main_ax.grid(True)
 
-        # Recreate the legend
+        # Create the legend (one marker per set)
+        handles = [Line2D([], [], linestyle='', marker='o', color=color) for color in colors]
+        labels = [str(set) if all_data or set == 0 else f"{set}: {', '.join(map(str, angles.get(set, [])))}" for set in ids]
         legend_ax.axis('off')  # Turn off axes for the legend
         legend_ax.legend(handles, labels, loc='center', fontsize=10, ncol=3, title="Legend by ID" if all_data else "Legend by ID with Respective Angles")
 
-        # Save the combined figure
+        # Save the combined figure (replacing the previous snapshot only once it is complete)
         os.makedirs(output_path, exist_ok=True)
-        if all_data:
-            combined_fig.savefig(os.path.join(output_path, 'all_data.png'), format='png', bbox_inches='tight')
-        else:
-            combined_fig.savefig(os.path.join(output_path, 'filtered_data.png'), format='png', bbox_inches='tight')
-        plt.close(combined_fig)
+        path = os.path.join(output_path, 'all_data.png' if all_data else 'filtered_data.png')
+        figure.savefig(path + '.tmp', format='png', bbox_inches='tight')
+        os.replace(path + '.tmp', path)
+
+
+    def save_diagram(self, all_data, max_height, max_width, output_path):
+        # Render the current points
+        self.render(self.snapshot(), all_data, max_height, max_width, output_path)
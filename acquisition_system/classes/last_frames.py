@@ -1,15 +1,57 @@
+from collections import deque
+import numpy as np
+
+
 class LastFrames:
     def __init__(self, max_frames = 75):
         self.max_frames = max_frames # Maximum number of frames to store 'n'
-        self.frames = [] # List to store the frames
+        self.frames = None # Preallocated block of shape (n, H, W, C), created with the first frame
+        self.start = 0 # Slot of the oldest stored frame
+        self.count = 0 # Number of frames currently stored
+        self.shared = deque() # Frames of a shared-memory FrameRing, held by reference instead of copied
+
+
+    def allocate(self, frame):
+        # Preallocate one contiguous block for 'n' frames with the shape and type of the given frame
+        self.frames = np.empty((self.max_frames,) + frame.shape, dtype=frame.dtype)
+        self.start = 0
+        self.count = 0
+
 
     def add_frame(self, frame):
-        # Add a new frame to the list
-        if len(self.frames) == self.max_frames:
-            self.frames.pop(0) # Remove the oldest frame if the limit is reached
-        self.frames.append(frame) # Add the new frame to the end of the list
+        # Copy a new frame into the ring buffer, overwriting the oldest one if the limit is reached
+        if getattr(frame, 'ring', None) is not None:
+            frame.retain() # Keep its slot from being overwritten by the decoder until the frame is dropped
+            self.shared.append(frame)
+            if len(self.shared) > self.max_frames:
+                self.shared.popleft().release()
+            return
+        if self.frames is None or self.frames.shape[1:] != frame.shape or self.frames.dtype != frame.dtype:
+            self.allocate(frame)
+        if self.count == self.max_frames:
+            self.start = (self.start + 1) % self.max_frames # Drop the oldest frame
+        else:
+            self.count += 1
+        self.frames[(self.start + self.count - 1) % self.max_frames] = frame
+
 
     def check_frame(self, num_max_frames):
-        # Trim the list of frames to a specified maximum length
-        if len(self.frames) > num_max_frames:
-            self.frames = self.frames[len(self.frames)-num_max_frames:] # Keep only the most recent and potentially necessary frames
\ No newline at end of file
+        # Logically trim the buffer to a specified maximum length (no data is moved)
+        while len(self.shared) > num_max_frames:
+            self.shared.popleft().release()
+        if self.count > num_max_frames:
+            self.start = (self.start + self.count - num_max_frames) % self.max_frames # Keep only the most recent and potentially necessary frames
+            self.count = num_max_frames
+
+
+    def get_frames(self, k):
+        # Return zero-copy views of the last 'k' stored frames, from oldest to newest
+        if self.shared:
+            return list(self.shared)[len(self.shared) - min(k, len(self.shared)):]
+        k = min(k, self.count)
+        first = self.start + self.count - k
+        return [self.frames[(first + i) % self.max_frames] for i in range(k)]
+
+
+    def __len__(self):
+        return len(self.shared) or self.count
@@ -1,13 +1,15 @@
-from .diagram import Diagram
 from .last_frames import LastFrames
-from .person import Person
+from .track_store import TrackStore
 import numpy as np
 import math
-from utils import get_msg_mgr
+from utils import get_msg_mgr, get_profiler
 import os
+import time
+import threading
 
 class SQAM:
-    def __init__(self, height, width, n = 75, p = 10, x = 5, t = 3, d = 15, v = 0.025, camera_dist = 920, diagrams = False):
+    def __init__(self, height, width, n = 75, p = 10, x = 5, t = 3, d = 15, v = 0.025, camera_dist = 920, diagrams = False, crop_frames = False, crop_padding = 0.1, exporter = None,
+                 diagrams_max_points = None, diagrams_decimation = 'reservoir', diagrams_every = None, diagrams_path = None):
         self.height = height
         self.width = width
         self.n = n # Maximum frames to track
@@ -18,39 +20,65 @@ class SQAM:
         self.v = v # Minimum allowed average speed
         self.camera_dist = camera_dist # Distance from camera to tracking plane to angle calculation
         self.diagrams = diagrams # Whether to use diagrams for data visualization
+        self.diagrams_every = diagrams_every # Minutes between snapshots of the diagrams saved in 'diagrams_path' (None: only at the end)
+        self.diagrams_path = diagrams_path
+        self.crop_frames = crop_frames # Whether to keep only each person's padded crop instead of whole frames
+        self.crop_padding = crop_padding # Padding added around the bounding box on each side (ratio of its width/height)
+        self.exporter = exporter # SequenceExporter that writes the valid sequences to disk (None to only log them)
 
         # Validate constraints
-        if not (2 <= self.p < self.n):
-            raise ValueError(f"Value of 'p' must be between 2 and 'n'={self.n} (exclusive).")
-        if not (1 <= self.t):
-            raise ValueError("Value of 't' must be greater than or equal to 1.")
-        if not (2 <= self.x <= self.n / 2):
-            raise ValueError(f"Value of 'x' must be between 2 and 'n/2'={self.n / 2}.")
-        if not (self.x * self.t <= self.n):
-            raise ValueError(f"The product of 'x' and 't' must be less than or equal to 'n'={self.n}.")
-        if not (1 <= self.camera_dist):
-            raise ValueError("Value of 'camera_dist' must be greater than or equal to 1.")
+        self.validate_parameters(n, p, x, t, camera_dist, crop_padding)
 
         # Initialize internal data structures
-        self.people = [] # List of tracked people
-        self.last_frames = LastFrames(self.n) # Store last frames with maximum of 'n' last frames
+        self.num_frames = 0 # Number of frames processed
+        self.tracks = TrackStore(self.n, self.x) # Columnar store of tracked people
+        if not self.crop_frames:
+            self.last_frames = LastFrames(self.n) # Store last frames with maximum of 'n' last frames
         if self.diagrams:
-            self.all_data = Diagram() # For all data points
-            self.filtered_data = Diagram() # For valid data points (complete sequences that meet criteria)
+            from .diagram import Diagram # Imported only when needed (matplotlib)
+            self.all_data = Diagram(diagrams_max_points, diagrams_decimation) # For all data points
+            self.filtered_data = Diagram(diagrams_max_points, diagrams_decimation) # For valid data points (complete sequences that meet criteria)
+            self.diagrams_thread = None # Thread rendering the last snapshot
+            self.last_snapshot = time.time()
+
+
+
+    @staticmethod
+    def validate_parameters(n = 75, p = 10, x = 5, t = 3, camera_dist = 920, crop_padding = 0.1, **kwargs):
+        # Validate the constraints between parameters (raises ValueError); other parameters are ignored
+        if not (2 <= p < n):
+            raise ValueError(f"Value of 'p' must be between 2 and 'n'={n} (exclusive).")
+        if not (1 <= t):
+            raise ValueError("Value of 't' must be greater than or equal to 1.")
+        if not (2 <= x <= n / 2):
+            raise ValueError(f"Value of 'x' must be between 2 and 'n/2'={n / 2}.")
+        if not (x * t <= n):
+            raise ValueError(f"The product of 'x' and 't' must be less than or equal to 'n'={n}.")
+        if not (1 <= camera_dist):
+            raise ValueError("Value of 'camera_dist' must be greater than or equal to 1.")
+        if not (0 <= crop_padding):
+            raise ValueError("Value of 'crop_padding' must be greater than or equal to 0.")
 
 
 
-    def add_new_people(self, boxes, track_ids):
+    def add_new_people(self, frame, boxes, track_ids):
         # Add new people to tracking system
-        for i, id in enumerate(track_ids):
-            person = Person(id, boxes[i])
+        for id, box in zip(track_ids, boxes):
+            person = self.tracks.add(id, box)
+            if frame is not None and self.crop_frames:
+                person.add_crop(self.crop_person(frame, box), self.n)
             if self.diagrams:
-                self.all_data.add_point(id, boxes[i].astype(int).tolist()) # Add to diagram
-            self.people.append(person)
+                self.all_data.add_point(id, box.tolist()) # Add to diagram
             self.new_entries_num += 1
 
 
 
+    def exclude(self, slot, reason):
+        # Mark a person to be removed at the end of the frame with the given reason
+        self.pending_exclusions.append((slot, reason))
+
+
+
     def delete_person(self, person, reason = None):
         # Remove a person from tracking and log the reason if provided
         if reason:
@@ -58,76 +86,112 @@ class SQAM:
                 "person_id": person.id,
                 "reason": reason,
                 "frames_tracked": len(person.box_history),
-                "first_position": person.box_history[0][:2],
-                "last_position": person.box_history[-1][:2]
+                "first_position": person.box_history[0][:2].tolist(),
+                "last_position": person.box_history[-1][:2].tolist()
             })
-        self.people.remove(person)
+        person.crops = None # Free the person's crop buffer
+        self.tracks.remove(person)
+
+
+
+    def crop_person(self, frame, box):
+        # Copy the padded bounding box region (x_center, y_center, width, height) of a person from the frame
+        x, y, w, h = box
+        pad_w = w * (0.5 + self.crop_padding)
+        pad_h = h * (0.5 + self.crop_padding)
+        x_min, y_min = max(int(x - pad_w), 0), max(int(y - pad_h), 0)
+        x_max, y_max = min(int(x + pad_w), self.width), min(int(y + pad_h), self.height)
+        return frame[y_min:y_max, x_min:x_max].copy()
 
 
 
     def process_new_frame(self, frame, boxes, track_ids):
-        # Process a new video frame and update tracking information
-        self.last_frames.add_frame(frame) # Add frame to history
-        num_max_frames = 0
+        # Process a new video frame and update tracking information ('frame' can be None when only detections are available)
+        if frame is not None and not self.crop_frames:
+            self.last_frames.add_frame(frame) # Add frame to history
         self.new_entries_num = 0
+        self.num_frames += 1
         detections_num = len(track_ids)
         self.exclusion_dict = [] # To store excluded sequences information
         self.complete_sequence_dict = [] # To store valid sequences information
-
-        if not self.people:
-            # If no people are being tracked, add new ones
-            self.add_new_people(boxes, track_ids)
-            if track_ids:
+        self.pending_exclusions = [] # People that failed a check in this frame
+        tracks = self.tracks
+        if detections_num == 0 and not tracks.slots:
+            # Empty scene: nothing to match, check or complete
+            self.update_tracking_info(detections_num, 0)
+            return
+        boxes = np.asarray(boxes).reshape(-1, 4).astype(int)
+
+        # Match detections to tracked people through the ID -> slot map
+        slots = tracks.lookup(track_ids)
+        matched = slots >= 0
+        seen = np.zeros(len(tracks.active), dtype=bool)
+        seen[slots[matched]] = True
+        lost = np.flatnonzero(tracks.active & ~seen) # People whose tracking is lost
+        slots, matched_boxes = slots[matched], boxes[matched]
+
+        # Update existing people's tracking data
+        tracks.add_positions(slots, matched_boxes)
+        if frame is not None and self.crop_frames:
+            for slot, box in zip(slots, matched_boxes):
+                tracks.people[slot].add_crop(self.crop_person(frame, box), self.n)
+        num_frames_tracked = tracks.length[slots]
+        valid = np.ones(len(slots), dtype=bool)
+
+        # Perform validation checks on all people at once
+        profiler = get_profiler()
+        check = num_frames_tracked >= self.p
+        if check.any():
+            with profiler.timer('sqam.check_direction_changes'):
+                valid[check] = self.check_direction_changes(slots[check])
+        check = valid & (num_frames_tracked % self.x == 0)
+        if check.any():
+            with profiler.timer('sqam.check_minimum_speed'):
+                valid[check] = self.check_minimum_speed(slots[check])
+            check &= valid
+            if check.any():
+                with profiler.timer('sqam.check_direction_reversal'):
+                    valid[check] = self.check_direction_reversal(slots[check])
+
+        # Update diagrams
+        if self.diagrams:
+            for slot, box, is_valid in zip(slots, matched_boxes, valid):
+                self.all_data.add_point(tracks.people[slot].id if is_valid else 0, box.tolist())
+        num_max_frames = int(num_frames_tracked[valid].max()) if valid.any() else 0
+
+        # Remove excluded people and process valid sequences, following the order in which people started being tracked
+        self.pending_exclusions.extend((slot, "Tracking Discontinuity") for slot in lost)
+        for slot, reason in sorted(self.pending_exclusions, key=lambda exclusion: tracks.order[exclusion[0]]):
+            self.delete_person(tracks.people[slot], reason)
+        complete = slots[valid & (num_frames_tracked == self.n)]
+        complete = complete[np.argsort(tracks.order[complete])]
+        angles = np.empty(0, dtype=int)
+        if len(complete):
+            with profiler.timer('sqam.get_angle'):
+                angles = self.get_angles(tracks.trendline[complete, 0], tracks.boxes[complete, int(self.n/2), :2],
+                                         tracks.boxes[complete, 0, 1], tracks.boxes[complete, self.n - 1, 1])
+        for slot, angle in zip(complete, angles.tolist()):
+            person = tracks.people[slot]
+            if self.diagrams:
+                self.filtered_data.add_set(person.id, person.box_history, angle)
+                self.filtered_data.add_point(0, person.box_history[-1].tolist())
+            self.use_valid_data(person, angle)
+            self.delete_person(person)
+
+        # Add new people to the system
+        if not matched.all():
+            self.add_new_people(frame, boxes[~matched], [id for id, is_matched in zip(track_ids, matched) if not is_matched])
+            if num_max_frames == 0:
                 num_max_frames = 1
-        else:
-            people_copy = self.people.copy()
-            for person in people_copy:
-                if person.id in track_ids:
-                    # Update existing person's tracking data
-                    idx = track_ids.index(person.id)
-                    person.add_position(boxes[idx])
-                    valid = True
-                    num_frames_tracked = len(person.box_history)
-
-                    # Perform validation checks
-                    if num_frames_tracked >= self.p:
-                        valid = self.check_direction_changes(person)
-                    if valid:
-                        if num_frames_tracked % self.x == 0:
-                            valid = self.check_minimum_speed(person)
-                            if valid:
-                               valid = self.check_direction_reversal(person)
-
-                    if valid:
-                        # Update diagrams and process valid sequences
-                        if self.diagrams:
-                            self.all_data.add_point(person.id, boxes[idx].astype(int).tolist())
-                        if num_frames_tracked > num_max_frames:
-                            num_max_frames = num_frames_tracked
-                        if num_frames_tracked == self.n:
-                            angle = self.get_angle(person.box_history, person.trendline)
-                            if self.diagrams:
-                                self.filtered_data.add_set(person.id, person.box_history, angle)
-                                self.filtered_data.add_point(0, boxes[idx].astype(int).tolist())
-                            self.use_valid_data(person, angle)
-                            self.delete_person(person)
-                    else:
-                        if self.diagrams:
-                            self.all_data.add_point(0, boxes[idx].astype(int).tolist())
-                    del track_ids[idx]
-                    boxes = np.delete(boxes.astype(int).tolist(), idx, axis=0)
-                else:
-                    # Remove person if tracking is lost
-                    self.delete_person(person, "Tracking Discontinuity")
 
-            # Add new people to the system
-            if len(track_ids) > 0:
-                self.add_new_people(boxes, track_ids)
-                if num_max_frames == 0:
-                    num_max_frames = 1
+        self.update_tracking_info(detections_num, num_max_frames)
 
+
+
+    def update_tracking_info(self, detections_num, num_max_frames):
         # Update frame tracking and tracking information
-        self.last_frames.check_frame(num_max_frames)
+        if not self.crop_frames:
+            self.last_frames.check_frame(num_max_frames)
         self.tracking_dict = {
                 "detections_num": detections_num,
                 "new_entries": self.new_entries_num,
@@ -136,79 +200,91 @@ class SQAM:
                 "num_max_frames": num_max_frames
             }
 
+        # Save a snapshot of the diagrams periodically
+        if self.diagrams and self.diagrams_every and self.diagrams_path is not None and time.time() - self.last_snapshot >= self.diagrams_every * 60:
+            self.save_diagrams(self.diagrams_path, background = True)
 
 
-    def check_direction_changes(self, person):
-        # Check if the person's direction remains consistent
-        if len(person.box_history) > self.p:
-            distance = person.distance_point_to_trendline()
-            if distance > self.d:
-                self.delete_person(person, f"Direction Change ({distance:.2f}>{self.d})")
-                return False
-        else:
-            if not person.has_variance():
-                self.delete_person(person, "Zero Variance")
-                return False
-        person.calculate_trendline_coefficients()
-        return True
 
+    def check_direction_changes(self, slots):
+        # Check if each person's direction remains consistent
+        tracks = self.tracks
+        over = tracks.length[slots] > self.p
+        distance = np.zeros(len(slots))
+        distance[over] = tracks.distance_point_to_trendline(slots[over])
+        changed = over & (distance > self.d)
+        no_variance = ~over
+        no_variance[~over] = ~tracks.has_variance(slots[~over])
+        for slot, dist in zip(slots[changed], distance[changed]):
+            self.exclude(slot, f"Direction Change ({dist:.2f}>{self.d})")
+        for slot in slots[no_variance]:
+            self.exclude(slot, "Zero Variance")
+        valid = ~(changed | no_variance)
+        tracks.calculate_trendline_coefficients(slots[valid])
+        return valid
 
 
-    def check_minimum_speed(self, person):
-        # Ensure the person maintains a minimum speed
-        person.calculate_speed(self.x)
-        if len(person.speed_history) >= self.t:
-            speed = person.calculate_average_speed(self.t)
-            if speed < self.v:
-                self.delete_person(person, f"Below Minimum Speed ({speed:.4f}<{self.v})")
-                return False
-        return True
 
+    def check_minimum_speed(self, slots):
+        # Ensure each person maintains a minimum speed
+        tracks = self.tracks
+        tracks.calculate_speed(slots, self.x)
+        enough = tracks.num_speeds[slots] >= self.t
+        speed = np.full(len(slots), np.inf)
+        speed[enough] = tracks.calculate_average_speed(slots[enough], self.t)
+        slow = speed < self.v
+        for slot, slot_speed in zip(slots[slow], speed[slow]):
+            self.exclude(slot, f"Below Minimum Speed ({slot_speed:.4f}<{self.v})")
+        return ~slow
 
 
-    def check_direction_reversal(self, person):
+
+    def check_direction_reversal(self, slots):
         # Detect reversal in direction based on speed history
-        if len(person.speed_history) >= 2:
-            if (person.speed_history[-1][0]*person.speed_history[-2][0] < 0) and (person.speed_history[-1][1]*person.speed_history[-2][1] < 0):
-                self.delete_person(person, "Reversed Direction")
-                return False
-        return True
+        tracks = self.tracks
+        num_speeds = tracks.num_speeds[slots]
+        last_speed = tracks.speeds[slots, num_speeds - 1]
+        previous_speed = tracks.speeds[slots, np.maximum(num_speeds - 2, 0)]
+        reversed = (num_speeds >= 2) & (last_speed[:, 0] * previous_speed[:, 0] < 0) & (last_speed[:, 1] * previous_speed[:, 1] < 0)
+        for slot in slots[reversed]:
+            self.exclude(slot, "Reversed Direction")
+        return ~reversed
     
 
 
-    def get_angle(self, box_history, trendline):
-        # Calculate the angle between the trajectory and a reference vector
+    def get_angle(self, trendline_slope, midpoint, start_y, end_y):
+        # Calculate the angle between the trajectory (trendline slope, middle position, first and last y) and a reference vector
         camera_position = [int(self.width/2), self.height + self.camera_dist]
-        if (camera_position[0]-box_history[int(self.n/2)][0]) != 0:
-            slope = (camera_position[1]-box_history[int(self.n/2)][1])/(camera_position[0]-box_history[int(self.n/2)][0])
+        if (camera_position[0]-midpoint[0]) != 0:
+            slope = (camera_position[1]-midpoint[1])/(camera_position[0]-midpoint[0])
             if slope > 0:
                 vector_director_1 = np.array([1, slope])
             else:
                 vector_director_1 = np.array([-1, -slope])
-            if trendline[0] > 0:
-                if box_history[0][1] < box_history[self.n - 1][1]:
-                    vector_director_2 = np.array([1, trendline[0]])
+            if trendline_slope > 0:
+                if start_y < end_y:
+                    vector_director_2 = np.array([1, trendline_slope])
                 else:
-                    vector_director_2 = np.array([-1, -trendline[0]])
+                    vector_director_2 = np.array([-1, -trendline_slope])
             else:
-                if box_history[0][1] < box_history[self.n - 1][1]:
-                    vector_director_2 = np.array([-1, -trendline[0]])
+                if start_y < end_y:
+                    vector_director_2 = np.array([-1, -trendline_slope])
                 else:
-                    vector_director_2 = np.array([1, trendline[0]]) 
+                    vector_director_2 = np.array([1, trendline_slope]) 
             dot_product = np.dot(vector_director_1, vector_director_2)
             norm_1 = np.linalg.norm(vector_director_1)
             norm_2 = np.linalg.norm(vector_director_2)
-            cos_angle = dot_product / (norm_1 * norm_2)
+            cos_angle = min(max(dot_product / (norm_1 * norm_2), -1), 1) # Parallel vectors can be rounded beyond [-1, 1]
             angle_radians = math.acos(cos_angle)
             angle_degrees = math.degrees(angle_radians)
             if vector_director_1[0] == 1:
-                if (trendline[0] < 0 and vector_director_2[0] == 1) or (trendline[0] > 0 and ((vector_director_2[0] == -1 and vector_director_1[1] < abs(vector_director_2[1])) or (vector_director_2[0] == 1 and vector_director_1[1] > vector_director_2[1]))):
+                if (trendline_slope < 0 and vector_director_2[0] == 1) or (trendline_slope > 0 and ((vector_director_2[0] == -1 and vector_director_1[1] < abs(vector_director_2[1])) or (vector_director_2[0] == 1 and vector_director_1[1] > vector_director_2[1]))):
                     angle_degrees = 360 - angle_degrees
             else:
-                if (trendline[0] > 0 and vector_director_2[0] == 1) or (trendline[0] < 0 and ((vector_director_2[0] == 1 and vector_director_1[1] > vector_director_2[1]) or (vector_director_2[0] == -1 and vector_director_1[1] < abs(vector_director_2[1])))):
+                if (trendline_slope > 0 and vector_director_2[0] == 1) or (trendline_slope < 0 and ((vector_director_2[0] == 1 and vector_director_1[1] > vector_director_2[1]) or (vector_director_2[0] == -1 and vector_director_1[1] < abs(vector_director_2[1])))):
                     angle_degrees = 360 - angle_degrees
         else:
-            if box_history[0][1] < box_history[self.n - 1][1]:
+            if start_y < end_y:
                 angle_degrees = 0
             else:
                 angle_degrees = 180
@@ -216,27 +292,97 @@ class SQAM:
     
 
 
+    def get_angles(self, trendline_slopes, midpoints, start_y, end_y):
+        # Vectorized get_angle for many sequences: the angle between the direction vectors is atan2(|cross|, dot),
+        # and the 360 degree disambiguation of get_angle is applied with masks
+        camera_position = [int(self.width/2), self.height + self.camera_dist]
+        midpoints = np.asarray(midpoints, dtype=np.float64).reshape(-1, 2)
+        trendline_slopes = np.asarray(trendline_slopes, dtype=np.float64)
+        delta_x = camera_position[0] - midpoints[:, 0]
+        vertical = delta_x == 0
+        slopes = (camera_position[1] - midpoints[:, 1]) / np.where(vertical, 1, delta_x)
+        start_y, end_y = np.asarray(start_y), np.asarray(end_y)
+        down = start_y < end_y
+        x_1 = np.where(slopes > 0, 1.0, -1.0)
+        x_2 = np.where((trendline_slopes > 0) == down, 1.0, -1.0)
+        y_1, y_2 = x_1 * slopes, x_2 * trendline_slopes
+        angles = np.degrees(np.arctan2(np.abs(x_1 * y_2 - y_1 * x_2), x_1 * x_2 + y_1 * y_2))
+        reflect = np.where(x_1 == 1,
+                           ((trendline_slopes < 0) & (x_2 == 1)) | ((trendline_slopes > 0) & (((x_2 == -1) & (y_1 < np.abs(y_2))) | ((x_2 == 1) & (y_1 > y_2)))),
+                           ((trendline_slopes > 0) & (x_2 == 1)) | ((trendline_slopes < 0) & (((x_2 == 1) & (y_1 > y_2)) | ((x_2 == -1) & (y_1 < np.abs(y_2))))))
+        angles = np.where(reflect, 360 - angles, angles)
+        angles = np.where(vertical, np.where(down, 0, 180), angles)
+        # get_angle truncates acos-based degrees, which differ from atan2 by a few ulps (up to ~1e-6 degrees near 0/180).
+        # Repeating its arithmetic elementwise does not remove the difference: np.dot and np.linalg.norm go through BLAS
+        # (fused multiply-adds) and np.arccos through SIMD kernels, so they round differently from the elementwise
+        # expressions and math.acos. Angles that close to an integer are computed with get_angle, so the output is identical
+        near = np.flatnonzero(~vertical & (np.abs(angles - np.round(angles)) < 1e-4))
+        angles = angles.astype(int)
+        for i in near:
+            angles[i] = self.get_angle(trendline_slopes[i], midpoints[i], start_y[i], end_y[i])
+        return angles
+
+
+
     def use_valid_data(self, person, angle):
         # Store or process valid sequences with calculated angle
-        # DO WHAT YOU WANT WITH VALID DATA USING "person", "angle" AND "self.last_frames"
+        # DO WHAT YOU WANT WITH VALID DATA USING "person", "angle" AND "frames"
+        if self.crop_frames:
+            frames = list(person.crops or []) # Padded crops of the person (oldest to newest)
+        else:
+            frames = self.last_frames.get_frames(len(person.box_history)) # Zero-copy views of the person's frames (oldest to newest)
         self.complete_sequence_dict.append({
             "person_id": person.id,
             "angle": angle,
             "frames_tracked": len(person.box_history),
-            "first_position": person.box_history[0][:2],
-            "last_position": person.box_history[-1][:2]
+            "first_position": person.box_history[0][:2].tolist(),
+            "last_position": person.box_history[-1][:2].tolist()
         })
+        if self.exporter is not None and frames:
+            if not self.crop_frames and self.exporter.crop:
+                frames = [self.crop_person(frame, box) for frame, box in zip(frames, person.box_history)]
+            self.exporter.submit({**self.complete_sequence_dict[-1], "positions": person.box_history.tolist(), "start_frame": self.num_frames - len(person.box_history),
+                                  "end_frame": self.num_frames - 1, "timestamp": time.time()}, frames)
+
+
+
+    def save_diagrams(self, output_path, background = False):
+        # Render both diagrams from a copy of their points, on a background thread for periodic snapshots
+        # (skipped while the previous snapshot is still being rendered)
+        if self.diagrams_thread is not None:
+            if background and self.diagrams_thread.is_alive():
+                return
+            self.diagrams_thread.join()
+        self.last_snapshot = time.time()
+        snapshots = [(self.all_data, self.all_data.snapshot(), True), (self.filtered_data, self.filtered_data.snapshot(), False)]
+        def render():
+            try:
+                for diagram, snapshot, all_data in snapshots:
+                    diagram.render(snapshot, all_data, self.height, self.width, output_path)
+            except Exception as e:
+                get_msg_mgr().log_warning(f"Error while saving the diagrams: {e}")
+        if background:
+            self.diagrams_thread = threading.Thread(target=render, name='diagrams', daemon=True)
+            self.diagrams_thread.start()
+        else:
+            render()
 
 
 
-    def end(self, output_path):
+    def end(self, output_path, msg_mgr = None):
         # Save diagrams and log the completion of processing
-        msg_mgr = get_msg_mgr()
+        if msg_mgr is None:
+            msg_mgr = get_msg_mgr()
         if self.diagrams:
-            output_path = os.path.join(output_path, 'diagrams')
-            msg_mgr.log_info(f"Diagrams and respective legends are saved in {output_path}")
-            self.all_data.save_diagram(True, self.height, self.width, output_path)
-            self.filtered_data.save_diagram(False, self.height, self.width, output_path)
+            output_path_diagrams = os.path.join(output_path, 'diagrams')
+            msg_mgr.log_info(f"Diagrams and respective legends are saved in {output_path_diagrams}")
+            self.save_diagrams(output_path_diagrams)
+        if self.exporter is not None:
+            stats = self.exporter.close() # Wait until every valid sequence is written
+            msg_mgr.log_info(f"Valid sequences exported in {self.exporter.output_path} --> {stats}")
+            if self.exporter.last_error is not None:
+                msg_mgr.log_warning(f"Error while exporting sequences: {self.exporter.last_error}")
+        get_profiler().report()
         msg_mgr.log_info('IT\'S FINISH!')
         output_path_log = os.path.join(output_path, 'logs')
         print(f'Log file is saved in {output_path_log}')
\ No newline at end of file
@@ -0,0 +1,129 @@
+import numpy as np
+from .person import Person
+
+
+class TrackStore:
+    def __init__(self, n = 75, x = 5, max_people = 64):
+        self.n = n # Maximum number of positions per track
+        self.max_speeds = n // x # Maximum number of speed values per track (one every 'x' positions)
+        self.slots = {} # Hash map from track ID to slot
+        self.people = [None] * max_people # Person handle of each slot
+        self.active = np.zeros(max_people, dtype=bool) # Slots in use
+        self.order = np.zeros(max_people, dtype=np.int64) # Insertion order of each track
+        self.boxes = np.zeros((max_people, n, 4), dtype=np.int64) # Position (bounding box) history of each track
+        self.length = np.zeros(max_people, dtype=np.int64) # Number of positions of each track
+        self.moments = np.zeros((max_people, 5), dtype=np.int64) # Running sums (x, y, x^2, y^2, x*y) of each track
+        self.trendline = np.zeros((max_people, 2)) # Trendline coefficients (slope, intercept) of each track
+        self.speeds = np.zeros((max_people, self.max_speeds, 2)) # Speed history of each track
+        self.num_speeds = np.zeros(max_people, dtype=np.int64) # Number of speed values of each track
+        self.free = list(range(max_people - 1, -1, -1)) # Stack of free slots
+        self.counter = 0 # Number of tracks added so far
+
+
+    def grow(self):
+        # Double the capacity of every column
+        capacity = len(self.people)
+        self.people.extend([None] * capacity)
+        for name in ('active', 'order', 'boxes', 'length', 'moments', 'trendline', 'speeds', 'num_speeds'):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate((column, np.zeros_like(column))))
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+
+    def add(self, id, box):
+        # Start a new track in a free slot and return its Person handle
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        self.slots[id] = slot
+        self.active[slot] = True
+        self.order[slot] = self.counter
+        self.counter += 1
+        self.length[slot] = 0
+        self.moments[slot] = 0
+        self.num_speeds[slot] = 0
+        person = Person(id, self, slot)
+        self.people[slot] = person
+        self.add_positions(np.array([slot]), box.reshape(1, 4))
+        return person
+
+
+    def remove(self, person):
+        # Free the slot of a track, keeping a copy of its data in the Person handle
+        slot = person.slot
+        person.detach()
+        del self.slots[person.id]
+        self.people[slot] = None
+        self.active[slot] = False
+        self.free.append(slot)
+
+
+    def lookup(self, track_ids):
+        # Slot of each track ID (-1 for IDs that are not being tracked)
+        return np.array([self.slots.get(id, -1) for id in track_ids], dtype=np.int64)
+
+
+    def add_positions(self, slots, boxes):
+        # Append one position (bounding box) to each track and update the running sums
+        self.boxes[slots, self.length[slots]] = boxes
+        self.length[slots] += 1
+        x, y = boxes[:, 0], boxes[:, 1]
+        self.moments[slots] += np.stack((x, y, x * x, y * y, x * y), axis=1)
+
+
+    def covariance(self, slots):
+        # Covariance terms (xx, yy, xy) of the positions of each track, scaled by the squared number of positions
+        num = self.length[slots]
+        sum_x, sum_y, sum_xx, sum_yy, sum_xy = self.moments[slots].T
+        cov_xx = num * sum_xx - sum_x * sum_x
+        cov_yy = num * sum_yy - sum_y * sum_y
+        cov_xy = num * sum_xy - sum_x * sum_y
+        return cov_xx, cov_yy, cov_xy
+
+
+    def has_variance(self, slots):
+        # Check if there is variance in the x or y coordinates of each track
+        cov_xx, cov_yy, _ = self.covariance(slots)
+        return (cov_xx != 0) | (cov_yy != 0)
+
+
+    def calculate_trendline_coefficients(self, slots):
+        # Calculate the coefficients of the trendline of each track as the principal direction (PCA) of its
+        # positions, using the closed-form eigenvector of the 2x2 covariance matrix
+        num = self.length[slots]
+        cov_xx, cov_yy, cov_xy = (cov.astype(float) for cov in self.covariance(slots))
+        root = np.sqrt((cov_xx - cov_yy) ** 2 + 4 * cov_xy ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Slope of the eigenvector of the largest eigenvalue (numerically stable form for both cases)
+            slope = np.where(cov_yy >= cov_xx, (cov_yy - cov_xx + root) / (2 * cov_xy), (2 * cov_xy) / (cov_xx - cov_yy + root))
+        slope = np.where(cov_xy == 0, np.where(cov_yy > cov_xx, 999999, 0), slope) # Handle undefined slope (vertical line)
+        # Calculate the intercept of the trendline through the mean position
+        sum_x, sum_y = self.moments[slots, 0], self.moments[slots, 1]
+        self.trendline[slots, 0] = slope
+        self.trendline[slots, 1] = sum_y / num - slope * sum_x / num
+
+
+    def distance_point_to_trendline(self, slots):
+        # Calculate the distance of the latest point of each track to its trendline
+        last = self.boxes[slots, self.length[slots] - 1]
+        slope, intercept = self.trendline[slots].T
+        return np.abs(slope * last[:, 0] - last[:, 1] + intercept) / np.sqrt(slope**2 + 1)
+
+
+    def calculate_speed(self, slots, x):
+        # Calculate relative speed of each track over its last 'x' positions
+        index = self.length[slots, None] - x + np.arange(x)
+        history_last_x_boxes = self.boxes[slots[:, None], index] # Get the last 'x' boxes
+        average_box_height = np.mean(history_last_x_boxes[:, :, 3], axis=1) # Average height of the bounding boxes
+        # Calculate relative speed in x and y directions
+        relative_speed = (history_last_x_boxes[:, -1, :2] - history_last_x_boxes[:, 0, :2]) / average_box_height[:, None]
+        self.speeds[slots, self.num_speeds[slots]] = relative_speed # Append to speed history
+        self.num_speeds[slots] += 1
+
+
+    def calculate_average_speed(self, slots, t):
+        # Calculate the average speed of each track over its last 't' speed measurements
+        index = self.num_speeds[slots, None] - t + np.arange(t)
+        history_last_t_speeds = self.speeds[slots[:, None], index] # Get the last 't' speeds
+        speeds = np.sqrt(np.sum(history_last_t_speeds**2, axis=2)) # Calculate magnitudes of speeds
+        return np.mean(speeds, axis=1) # Return the average speeds
@@ -1,39 +1,378 @@
 import os
-from ultralytics import YOLO
+import ast
+import copy
 import cv2
-from collections import defaultdict
+import json
 import numpy as np
-from utils import load_config, get_color_for_id, get_msg_mgr
+from utils import load_config, get_color_for_id, EXPORTED_MODELS, get_exported_path, get_msg_mgr, get_profiler, Pipeline, Stage, StageQueue, STOP, DetectionLogWriter, create_trackers, track_batch, SequenceExporter, TrackTrails, VideoEncoder, DecoderProcess, DetectionScheduler
 from classes import SQAM
 import sys
+import time
+import signal
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
+profiler = get_profiler() # Per-stage timers (enabled in 'profile_cfg')
+stop_event = threading.Event() # Set on SIGINT/SIGTERM to stop decoding and finish cleanly
 
-# Function to annotate frames with bounding boxes, IDs, and tracking history
+
+# Function to choose the model to load: 'model_path' itself, or a model exported from it ('model_format').
+# With 'auto', the first exported model found is used when inference runs on the CPU, and the weights otherwise
+def select_model(model_path, model_format = 'auto', cpu = True):
+    if model_format not in ('auto', 'pytorch', *EXPORTED_MODELS):
+        raise ValueError(f"Unknown model format '{model_format}' (use 'auto', 'pytorch' or one of {list(EXPORTED_MODELS)}).")
+    if not model_path.endswith('.pt') or model_format == 'pytorch' or (model_format == 'auto' and not cpu):
+        return model_path
+    if model_format == 'auto':
+        exported = [get_exported_path(model_path, format) for format in EXPORTED_MODELS]
+        return next((path for path in exported if os.path.exists(path)), model_path)
+    path = get_exported_path(model_path, model_format)
+    if not os.path.exists(path):
+        raise ValueError(f"Model exported as '{model_format}' not found: {path} (run object_detector/Yolo/run_model.py --phase export).")
+    return path
+
+
+
+# Function to check whether a model accepts any input size: the weights, or a model exported with 'dynamic: true'
+# (Ultralytics runs models with static shapes at their export size, whatever 'imgsz' is given), from its export metadata
+def accepts_input_size(model_path):
+    if model_path.endswith('.pt'):
+        return True
+    try:
+        if os.path.isdir(model_path): # OpenVINO
+            metadata = load_config(os.path.join(model_path, 'metadata.yaml'))
+        elif model_path.endswith('.onnx'):
+            import onnxruntime
+            metadata = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider']).get_modelmeta().custom_metadata_map
+            metadata = {"args": ast.literal_eval(metadata.get('args', '{}'))} # Values are stored as strings
+        elif model_path.endswith('.torchscript'):
+            import torch
+            extra_files = {'config.txt': ''}
+            torch.jit.load(model_path, _extra_files=extra_files, map_location='cpu')
+            metadata = json.loads(extra_files['config.txt'])
+        else:
+            return False
+    except (OSError, ImportError, ValueError, SyntaxError):
+        return False
+    return bool((metadata or {}).get('args', {}).get('dynamic', False))
+
+
+
+# Function to choose the number of inference threads: all the available cores, minus one for decoding and SQAM when they run in parallel
+def get_inference_threads(threads = None, pipeline_cfg = None):
+    if threads is not None:
+        return threads
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    return max(1, cores - (1 if pipeline_cfg and pipeline_cfg['enabled'] else 0))
+
+
+
+# Function to load the YOLO model (weights or exported model). ultralytics (and torch) are only imported here, so that the rest of this module
+# and the replay/offline tools do not need them
+def load_model(model_path, model_format = 'auto', device = None, threads = None, pipeline_cfg = None):
+    start = time.perf_counter()
+    threads = get_inference_threads(threads, pipeline_cfg)
+    os.environ.setdefault('OMP_NUM_THREADS', str(threads)) # Read by the OpenMP runtimes when they are loaded
+    import torch
+    from ultralytics import YOLO
+    imported = time.perf_counter()
+    torch.set_num_threads(threads) # PyTorch and TorchScript inference, and the pre/post-processing of every format
+    cpu = str(device).lower() == 'cpu' or not torch.cuda.is_available()
+    path = select_model(model_path, model_format, cpu)
+    model = YOLO(path, task = 'detect')
+    return model, {"path": path, "threads": threads, "import_s": round(imported - start, 3), "load_s": round(time.perf_counter() - imported, 3)}
+
+
+
+# Function to annotate frames with bounding boxes, IDs, and tracking history (last 30 positions)
 def draw_in_frame(frame, track_history, boxes, track_ids, confidences):
-    for box, track_id, confidence in zip(boxes, track_ids, confidences):
-        x, y, w, h = box
-        track = track_history[track_id] # Retrieve or initialize track history for the ID
-        track.append((float(x), float(y))) # Add the current position to the track history
-        if len(track) > 30: # Limit track history to the last 30 points
-            track.pop(0)
-
-        # Convert bounding box coordinates to integers and draw rectangle on the frame
-        x, y, w, h = map(int, (x, y, w, h))
-        color = get_color_for_id(track_id) # Get consistent color for the track ID
-        cv2.rectangle(frame, (x - w // 2, y - h // 2), (x + w // 2, y + h // 2), color, 2)
-        
+    track_history.new_frame() # Frees the trails of the IDs no longer seen
+    # Corners of every bounding box as a polyline that returns to its first corner
+    boxes = np.asarray(boxes).astype(int)
+    x_min, y_min = boxes[:, 0] - boxes[:, 2] // 2, boxes[:, 1] - boxes[:, 3] // 2
+    x_max, y_max = boxes[:, 0] + boxes[:, 2] // 2, boxes[:, 1] + boxes[:, 3] // 2
+    corners = np.stack((x_min, y_min, x_max, y_min, x_max, y_max, x_min, y_max, x_min, y_min), axis=1).astype(np.int32).reshape(-1, 5, 2)
+    for box, box_corners, track_id, confidence in zip(boxes, corners, track_ids, confidences):
+        track = track_history.add(track_id, box[0], box[1]) # Add the current position to the track history
+
+        # Draw the rectangle and the tracking line with the consistent color of the track ID in one call
+        color = get_color_for_id(track_id)
+        cv2.polylines(frame, [box_corners, track] if len(track) > 1 else [box_corners], isClosed=False, color=color, thickness=2)
+
         # Add a label with ID and confidence
         label = f"ID: {track_id}; Conf: {confidence:.2f}"  
-        cv2.putText(frame, label, (x - w // 2, y - h // 2 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
-        
-        # Draw tracking lines for the last points in the history
-        if len(track) > 1:
-            points = np.array(track, dtype=np.int32).reshape((-1, 1, 2))
-            cv2.polylines(frame, [points], isClosed=False, color=color, thickness=2)
+        cv2.putText(frame, label, (int(box_corners[0, 0]), int(box_corners[0, 1]) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
     return frame
 
 
 
+# Function to stop processing cleanly on SIGINT/SIGTERM: decoding stops, the frames already decoded are processed
+# and every output is flushed (a second signal exits immediately)
+def handle_stop_signal(signum, frame):
+    stop_event.set()
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+
+# Generator of decoded frames until the video ends or a stop is requested
+def read_frames(cap):
+    while cap.isOpened() and not stop_event.is_set():
+        with profiler.timer('decode'):
+            success, frame = cap.read() # Read next video frame
+        if not success:
+            break # Stop if no more frames
+        yield frame
+
+
+
+# Function to open the frame source of a video: decoded on a thread of this process (read_frames) or, with
+# 'decode_process', in a separate process that decodes into a shared-memory ring (returns the frames and the decoder).
+# 'held_frames' is the number of frames the tracking stage can hold (deferred by the detection scheduler)
+def open_frames(input_video_path, cap, width, height, pipeline_cfg, sqam_cfg, held_frames = 0):
+    if not pipeline_cfg['decode_process']:
+        return read_frames(cap), None
+    # Every frame that can be alive at once needs a slot: the last 'n' frames of SQAM and those in the queues and stages
+    num_slots = pipeline_cfg['ring_slots'] or (sqam_cfg['n'] + pipeline_cfg['decode_queue_size'] + pipeline_cfg['track_queue_size'] + pipeline_cfg['sqam_queue_size'] + held_frames + 4)
+    if num_slots < sqam_cfg['n'] + held_frames + 2:
+        raise ValueError(f"Value of 'ring_slots' must be at least 'n' + 2{' + idle_stride - 1' if held_frames else ''} = {sqam_cfg['n'] + held_frames + 2}, "
+                         "or decoding would wait forever for a free slot.")
+    decoder = DecoderProcess(input_video_path, (height, width, 3), num_slots)
+    return decoder.frames(stop_event), decoder
+
+
+
+# Function to give back the slot of a shared-memory frame (in an item of the pipeline) once no stage needs it
+def release_frame(item):
+    for value in (item if isinstance(item, tuple) else (item,)):
+        if getattr(value, 'ring', None) is not None:
+            value.release()
+
+
+
+# Function to get the detections of a frame without any object
+def no_detections(frame):
+    return frame, np.empty((0, 4), dtype=np.float32), [], np.empty(0, dtype=np.float32)
+
+
+
+# Function to perform object tracking with YOLO on a frame. Returns its detections and the number of objects detected
+# (including those not yet confirmed by the tracker)
+def detect_frame(model, track_cfg, frame):
+    with profiler.timer('track'):
+        results = model.track(frame, persist = True, **track_cfg)
+    if results[0].boxes.id is None: # No tracked objects in the frame
+        return no_detections(frame), len(results[0].boxes)
+    data = results[0].boxes.data.cpu().numpy() # Single transfer of the rows (x1, y1, x2, y2, id, conf, cls)
+    boxes = np.stack(((data[:, 0] + data[:, 2]) / 2, (data[:, 1] + data[:, 3]) / 2,
+                      data[:, 2] - data[:, 0], data[:, 3] - data[:, 1]), axis=1) # Bounding boxes (x, y, w, h)
+    track_ids = data[:, 4].astype(int).tolist() # Object IDs
+    confidences = data[:, 5] # Confidence scores
+    return (frame, boxes, track_ids, confidences), len(results[0].boxes)
+
+
+
+# Functions to save and restore the state of the trackers of a model (kept by the Ultralytics predictor), to track frames again
+def save_trackers(model):
+    trackers = getattr(getattr(model, 'predictor', None), 'trackers', None)
+    if trackers is None:
+        return None
+    # The ReID model and the OpenCV objects of the motion compensation hold no state of the tracks: they are shared, not copied
+    memo = {}
+    for tracker in trackers:
+        if getattr(tracker, 'encoder', None) is not None:
+            memo[id(tracker.encoder)] = tracker.encoder
+        if getattr(tracker, 'gmc', None) is not None:
+            for value in vars(tracker.gmc).values():
+                if type(value).__module__.startswith('cv2'):
+                    memo[id(value)] = value
+    return copy.deepcopy(trackers, memo)
+
+def restore_trackers(model, trackers):
+    if trackers is not None:
+        model.predictor.trackers = trackers
+
+
+
+# Function to perform object tracking with YOLO on a frame. Returns the detections of the frames ready for SQAM, in order:
+# with a scheduler, frames of an empty scene can be held (none is returned) until a later frame is detected at a reduced rate
+# and/or resolution. If it detects anything, the tracker is rewound and they are tracked again with it at full resolution,
+# so a person entering the scene is tracked from their first frame; otherwise they are returned without detections
+def track_frame(model, track_cfg, frame, scheduler = None):
+    if scheduler is None:
+        return [detect_frame(model, track_cfg, frame)[0]]
+    overrides = scheduler.next_frame()
+    if overrides is None: # Detection deferred
+        scheduler.defer(frame)
+        return []
+    trackers = save_trackers(model) if scheduler.probing else None
+    detections, detections_num = detect_frame(model, {**track_cfg, **overrides}, frame)
+    deferred, redetect = scheduler.observe(detections_num)
+    if not redetect:
+        return [no_detections(deferred_frame) for deferred_frame in deferred] + [detections]
+    restore_trackers(model, trackers)
+    return [detect_frame(model, {**track_cfg, **scheduler.full_overrides}, redetected_frame)[0] for redetected_frame in deferred + [frame]]
+
+
+
+# Function to get the frames still held by the scheduler when the video ends, without detections
+def flush_frames(scheduler = None):
+    return [no_detections(frame) for frame in scheduler.flush()] if scheduler is not None else []
+
+
+
+# Generator of the detections of every frame, in order, for the serial loop
+def track_frames(model, track_cfg, frames, scheduler = None):
+    for frame in frames:
+        yield from track_frame(model, track_cfg, frame, scheduler)
+    yield from flush_frames(scheduler)
+
+
+
+# Function to process the detections of a frame in SQAM, log the system state and record the detections if enabled
+def analyse_frame(sqam, msg_mgr, recorder, detections, release = False, scheduler = None):
+    frame, boxes, track_ids, confidences = detections
+    if recorder is not None:
+        recorder.add_frame(boxes, track_ids, confidences)
+    with profiler.timer('sqam'):
+        sqam.process_new_frame(frame, boxes, track_ids.copy())
+    if scheduler is not None:
+        scheduler.set_tracked(len(sqam.tracks.slots)) # Full rate while anyone is accumulating toward 'n' frames
+    with profiler.timer('log'):
+        msg_mgr.log_system_info(sqam.tracking_dict, sqam.exclusion_dict, sqam.complete_sequence_dict)
+    profiler.tick()
+    if release: # Last stage that uses the frame (no annotations)
+        release_frame(frame)
+    return detections
+
+
+
+# Function to draw the annotations of a frame and save it to the output video
+def annotate_frame(track_history, out, detections):
+    frame, boxes, track_ids, confidences = detections
+    if getattr(frame, 'ring', None) is not None:
+        shared_frame, frame = frame, frame.copy() # Draw on a copy, since SQAM may still hold the shared frame
+        shared_frame.release()
+    with profiler.timer('annotate'):
+        frame = draw_in_frame(frame, track_history, boxes, track_ids, confidences)
+    if out is not None:
+        out.write(frame) # Queue the annotated frame to be encoded in the output video
+    return frame
+
+
+
+# Function to create the background writer of valid sequences (None if disabled)
+def create_exporter(export_cfg, output_path, fps, camera):
+    if not export_cfg['enabled']:
+        return None
+    return SequenceExporter(output_path, export_cfg['format'], export_cfg['workers'], export_cfg['queue_size'], export_cfg['policy'],
+                            export_cfg['crop'], export_cfg['crop_size'], fps, camera)
+
+
+
+# Function to create the encoder of the annotated video (cv2.VideoWriter on its own thread)
+def create_encoder(encoder_cfg, output_path_video, fps, width, height):
+    return VideoEncoder(output_path_video, fps, (width, height), encoder_cfg['scale'], encoder_cfg['fps'], encoder_cfg['queue_size'], encoder_cfg['policy'])
+
+
+
+# Function to run several video sources through one model, gathering one frame of each live stream
+# into a single batched inference call, with a separate tracker, SQAM, outputs and logs per stream
+def run_multi_stream(model, sources, general_cfg, track_cfg, sqam_cfg, pipeline_cfg, export_cfg, encoder_cfg, output_path):
+    msg_mgr = get_msg_mgr()
+    save_video = general_cfg['save_annotated_video']
+    if general_cfg['show_annotated_frames']:
+        msg_mgr.log_warning("'show_annotated_frames' is not supported in multi-stream mode and is ignored.")
+    streams = []
+    for source in sources:
+        # Open the source and prepare its own outputs, logger and SQAM
+        name = source['name']
+        stream_output_path = os.path.join(output_path, name)
+        stream_msg_mgr = get_msg_mgr(name)
+        stream_msg_mgr.init_logger(stream_output_path, general_cfg['log_to_file'], name, general_cfg['structured_log'], general_cfg['console_log_every'])
+        cap = cv2.VideoCapture(source['input_video_path'])
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        stream_msg_mgr.log_info(f"Video Properties of {source['input_video_path']} --> \'fps\': {fps}, \'width\': {width}, \'height\': {height}")
+        stream = {"name": name, "cap": cap, "fps": fps, "output_path": stream_output_path, "msg_mgr": stream_msg_mgr,
+                  "sqam": SQAM(height, width, **sqam_cfg, exporter = create_exporter(export_cfg, os.path.join(stream_output_path, 'sequences'), fps, name),
+                               diagrams_path = os.path.join(stream_output_path, 'diagrams')), "recorder": None, "out": None, "latencies": []}
+        if general_cfg['record_detections']:
+            stream["recorder"] = DetectionLogWriter(os.path.join(stream_output_path, 'detections'), height, width, fps)
+
+        # Decode on its own thread (fed by a decoder process with 'decode_process')
+        frames, stream["decode_process"] = open_frames(source['input_video_path'], cap, width, height, pipeline_cfg, sqam_cfg)
+        stream["decoder"] = Pipeline()
+        stream["decode_queue"] = stream["decoder"].add_stage('decode', ((time.time(), frame) for frame in frames),
+                                                             pipeline_cfg['decode_queue_size'], pipeline_cfg['decode_policy'], release_frame)
+
+        # Annotate and encode on its own thread
+        if save_video:
+            os.makedirs(os.path.join(stream_output_path, 'annotated_video'), exist_ok=True)
+            stream["output_path_video"] = os.path.join(stream_output_path, 'annotated_video', name + '.mp4')
+            stream["out"] = create_encoder(encoder_cfg, stream["output_path_video"], fps, width, height)
+            stream["annotate_queue"] = StageQueue(pipeline_cfg['sqam_queue_size'], pipeline_cfg['sqam_policy'], release_frame)
+            stream["annotator"] = Stage('annotate', partial(annotate_frame, TrackTrails(), stream["out"]), stream["annotate_queue"])
+            stream["annotator"].start()
+        streams.append(stream)
+        stream["decoder"].start()
+
+    trackers = create_trackers(track_cfg['tracker'], [stream["fps"] for stream in streams])
+    for stream, tracker in zip(streams, trackers):
+        stream["tracker"] = tracker
+        stream["msg_mgr"].log_info('Start Tracking!')
+        stream["msg_mgr"].reset_time()
+    msg_mgr.log_info(f"Start Tracking {len(streams)} streams!")
+
+    # Processing loop: one frame of each live stream per batch
+    start = time.time()
+    num_frames = 0
+    live_streams = streams
+    while live_streams:
+        batch = []
+        for stream in live_streams:
+            item = stream["decode_queue"].get()
+            if item is not STOP:
+                batch.append((stream, item))
+        live_streams = [stream for stream, _ in batch]
+        if not batch:
+            break
+        with profiler.timer('track_batch'):
+            detections = track_batch(model, [stream["tracker"] for stream, _ in batch], [frame for _, (_, frame) in batch], track_cfg)
+        for (stream, (decoded_time, _)), frame_detections in zip(batch, detections):
+            analyse_frame(stream["sqam"], stream["msg_mgr"], stream["recorder"], frame_detections, release = not save_video)
+            stream["latencies"].append(time.time() - decoded_time) # From decoding to the end of SQAM
+            if save_video:
+                stream["annotate_queue"].put(frame_detections)
+        num_frames += len(batch)
+    elapsed = time.time() - start
+    if stop_event.is_set():
+        msg_mgr.log_warning("Stop requested: decoding stopped, saving the outputs...")
+
+    # Cleanup resources and report throughput and per-stream latency
+    msg_mgr.log_info(f"Processed {num_frames} frames from {len(streams)} streams in {elapsed:.2f}s ({num_frames / max(elapsed, 1e-9):.2f} frames/s)")
+    for stream in streams:
+        stream["decoder"].join()
+        stream["cap"].release()
+        if save_video:
+            stream["annotate_queue"].put(STOP)
+            stream["annotator"].join()
+            encoder_stats = stream["out"].release()
+            stream["msg_mgr"].log_info(f"Annotated video saved in {stream['output_path_video']} --> {encoder_stats}")
+        if stream["recorder"] is not None:
+            stream["recorder"].close()
+        latencies = np.array(stream["latencies"]) * 1000
+        if len(latencies):
+            msg_mgr.log_info(f"Stream {stream['name']} --> \'frames\': {len(latencies)}, \'mean latency\': {latencies.mean():.2f}ms, \'p95 latency\': {np.percentile(latencies, 95):.2f}ms")
+        stream["sqam"].end(stream["output_path"], stream["msg_mgr"])
+        if stream["decode_process"] is not None:
+            stream["decode_process"].close()
+        stream["msg_mgr"].close()
+
+
+
 if __name__ == '__main__':
     # Load configuration file and prepare output directory
     cfg_path = os.path.abspath('acquisition_system/configs/system.yaml')
@@ -44,19 +383,57 @@ if __name__ == '__main__':
     general_cfg = cfg['general_cfg']
     track_cfg = cfg['track_cfg']
     sqam_cfg = cfg['sqam_cfg']
+    pipeline_cfg = cfg['pipeline_cfg']
+    profile_cfg = cfg['profile_cfg']
+    export_cfg = cfg['export_cfg']
+    encoder_cfg = cfg['encoder_cfg']
+    scheduler_cfg = cfg['scheduler_cfg']
 
     # Initialize logging system
     msg_mgr = get_msg_mgr()
-    msg_mgr.init_logger(output_path, general_cfg['log_to_file'])
+    msg_mgr.init_logger(output_path, general_cfg['log_to_file'], structured = general_cfg['structured_log'], console_every = general_cfg['console_log_every'])
 
     # Log configuration details
     msg_mgr.log_info(f'Config file loaded from {cfg_path}')
     msg_mgr.log_info(general_cfg)
     msg_mgr.log_info(track_cfg)
     msg_mgr.log_info(sqam_cfg)
+    msg_mgr.log_info(pipeline_cfg)
+    msg_mgr.log_info(profile_cfg)
+    msg_mgr.log_info(export_cfg)
+    msg_mgr.log_info(encoder_cfg)
+    msg_mgr.log_info(scheduler_cfg)
+    dropping = [name for name in ('decode_policy', 'track_policy') if pipeline_cfg[name] == 'drop_oldest']
+    if export_cfg['enabled'] and dropping and (pipeline_cfg['enabled'] or cfg['multi_stream_cfg']['enabled']):
+        # Dropped frames are never seen by SQAM, so the exported sequences may have gaps that are not detected
+        msg_mgr.log_warning(f"{' and '.join(dropping)} 'drop_oldest' silently drops frames before SQAM: exported sequences may skip frames (use 'block' to export sequences).")
+
+    # Initialize per-stage timers
+    profiler.configure(profile_cfg['enabled'], os.path.join(output_path, 'profile'), msg_mgr, profile_cfg['dump_every'])
+
+    # Stop cleanly on SIGINT/SIGTERM (e.g. when running as a service)
+    signal.signal(signal.SIGINT, handle_stop_signal)
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+
+    # Load YOLO model on a background thread, overlapping with opening the video and creating the outputs and SQAM
+    model_loader = ThreadPoolExecutor(1)
+    model_future = model_loader.submit(load_model, general_cfg['model_path'], general_cfg['model_format'], track_cfg.get('device'), general_cfg['inference_threads'], pipeline_cfg)
+
+    # Multi-stream mode: all sources share the model with batched inference
+    multi_stream_cfg = cfg['multi_stream_cfg']
+    if multi_stream_cfg['enabled']:
+        msg_mgr.log_info(multi_stream_cfg)
+        try:
+            SQAM.validate_parameters(**sqam_cfg)
+        except ValueError as e:
+            msg_mgr.log_warning(f"Error while creating the SQAM: {e}")
+            sys.exit()
+        model, load_times = model_future.result()
+        msg_mgr.log_info(f"Model loaded from {load_times.pop('path')} --> {load_times}")
+        run_multi_stream(model, multi_stream_cfg['sources'], general_cfg, track_cfg, sqam_cfg, pipeline_cfg, export_cfg, encoder_cfg, output_path)
+        sys.exit()
 
-    # Load YOLO model and video input
-    model = YOLO(general_cfg['model_path'])
+    # Load video input
     cap = cv2.VideoCapture(general_cfg['input_video_path'])
 
     # Get video properties
@@ -68,58 +445,101 @@ if __name__ == '__main__':
     # Setup video saving and/or frame display
     save_video = general_cfg['save_annotated_video']
     show_frames = general_cfg['show_annotated_frames']
+    out = None
     if save_video:
         os.makedirs(os.path.join(output_path, 'annotated_video'), exist_ok=True)
         output_path_video = os.path.join(output_path, 'annotated_video', general_cfg['name'] + '.mp4')
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path_video, fourcc, fps, (width, height))
+        out = create_encoder(encoder_cfg, output_path_video, fps, width, height)
     if save_video or show_frames: 
-        track_history = defaultdict(lambda: []) # Initialize track histories for visualizations
+        track_history = TrackTrails() # Initialize track histories for visualizations
+
+    # Setup detection recording (to replay SQAM without YOLO)
+    recorder = None
+    if general_cfg['record_detections']:
+        output_path_detections = os.path.join(output_path, 'detections', general_cfg['name'])
+        recorder = DetectionLogWriter(output_path_detections, height, width, fps)
 
     # Initialize Sequence Quality Analysis Module (SQAM) 
     try:
-        sqam = SQAM(height, width, **sqam_cfg)
+        sqam = SQAM(height, width, **sqam_cfg, exporter = create_exporter(export_cfg, os.path.join(output_path, 'sequences', general_cfg['name']), fps, general_cfg['name']),
+                    diagrams_path = os.path.join(output_path, 'diagrams'))
     except ValueError as e:
         msg_mgr.log_warning(f"Error while creating the SQAM: {e}")
         sys.exit()
+    # Setup the detection scheduler (reduced detection while the scene is empty)
+    scheduler = None
+    if scheduler_cfg['enabled']:
+        try:
+            scheduler = DetectionScheduler(scheduler_cfg['idle_after'], scheduler_cfg['idle_stride'], scheduler_cfg['idle_imgsz'], track_cfg.get('imgsz', 640))
+        except ValueError as e:
+            msg_mgr.log_warning(f"Error while creating the detection scheduler: {e}")
+            sys.exit()
+    model, load_times = model_future.result() # Before the decoder process is forked, so that no import is in progress
+    model_path = load_times.pop('path')
+    msg_mgr.log_info(f"Model loaded from {model_path} --> {load_times}")
+    if scheduler is not None and scheduler.idle_overrides and not accepts_input_size(model_path):
+        msg_mgr.log_warning(f"'idle_imgsz' is ignored, since {model_path} has a fixed input size (export it with 'dynamic: true' to use it).")
+        scheduler.keep_size()
+    frames, decoder = open_frames(general_cfg['input_video_path'], cap, width, height, pipeline_cfg, sqam_cfg, scheduler.idle_stride - 1 if scheduler is not None else 0)
     msg_mgr.log_info('Start Tracking!')
     msg_mgr.reset_time()
-    
-    # Video processing loop
-    while cap.isOpened():
-        success, frame = cap.read() # Read next video frame
-        if success:
-            # Perform object tracking with YOLO
-            results = model.track(frame, persist = True, **track_cfg)
-            boxes = results[0].boxes.xywh.cpu().numpy() # Get bounding boxes
-            track_ids = results[0].boxes.id.int().cpu().tolist() # Get object IDs
-
-            # Process current frame data in SQAM
-            sqam.process_new_frame(frame, boxes, track_ids.copy())
-            msg_mgr.log_system_info(sqam.tracking_dict, sqam.exclusion_dict, sqam.complete_sequence_dict)
+
+    if pipeline_cfg['enabled']:
+        # Staged pipeline: decoding, tracking, SQAM and annotation/encoding run on their own threads,
+        # connected by bounded queues, so total throughput is bounded by the slowest stage
+        pipeline = Pipeline()
+        pipeline.add_stage('decode', frames, pipeline_cfg['decode_queue_size'], pipeline_cfg['decode_policy'], release_frame)
+        pipeline.add_stage('track', partial(track_frame, model, track_cfg, scheduler = scheduler), pipeline_cfg['track_queue_size'], pipeline_cfg['track_policy'], release_frame,
+                           partial(flush_frames, scheduler))
+        if save_video or show_frames:
+            pipeline.add_stage('sqam', partial(analyse_frame, sqam, msg_mgr, recorder, scheduler = scheduler), pipeline_cfg['sqam_queue_size'], pipeline_cfg['sqam_policy'], release_frame)
+            display_queue = pipeline.add_stage('annotate', partial(annotate_frame, track_history, out), 1 if show_frames else None)
+        else:
+            pipeline.add_stage('sqam', partial(analyse_frame, sqam, msg_mgr, recorder, release = True, scheduler = scheduler))
+        pipeline.start()
+        try:
+            if show_frames:
+                # Display the annotated frames on the main thread
+                while (frame := display_queue.get()) is not STOP:
+                    with profiler.timer('display'):
+                        cv2.imshow("Tracking", frame) # Display the frame
+                        key = cv2.waitKey(1)
+                    if (key & 0xFF == ord("q")): # Stop decoding on 'q' key press
+                        pipeline.stop()
+        finally:
+            pipeline.join()
+        msg_mgr.log_info(f"Frames dropped by the pipeline queues: {pipeline.dropped()}")
+    else:
+        # Serial video processing loop
+        for detections in track_frames(model, track_cfg, frames, scheduler):
+            detections = analyse_frame(sqam, msg_mgr, recorder, detections, release = not (save_video or show_frames), scheduler = scheduler)
 
             # Draw annotations if enabled
             if save_video or show_frames: 
-                confidences=results[0].boxes.conf.cpu() # Get confidence scores
-                frame = draw_in_frame(frame, track_history, boxes, track_ids, confidences)
-
-            if save_video:
-                out.write(frame) # Save the annotated frame to output video
+                frame = annotate_frame(track_history, out, detections)
             if show_frames:
                 cv2.imshow("Tracking", frame) # Display the frame
 
-            # Exit loop on 'q' key press
-            if (cv2.waitKey(1) & 0xFF == ord("q")):
-                break
-        else:
-            break # Stop loop if no more frames
+                # Exit loop on 'q' key press (no GUI polling in headless mode)
+                if (cv2.waitKey(1) & 0xFF == ord("q")):
+                    break
+
+    if stop_event.is_set():
+        msg_mgr.log_warning("Stop requested: decoding stopped, saving the outputs...")
 
     # Cleanup resources
     cap.release()
     if save_video:
-        out.release()
-        msg_mgr.log_info(f"Annotated video saved in {output_path_video}")
+        encoder_stats = out.release()
+        msg_mgr.log_info(f"Annotated video saved in {output_path_video} --> {encoder_stats}")
+    if recorder is not None:
+        recorder.close()
+        msg_mgr.log_info(f"Detections recorded in {output_path_detections}")
+    if scheduler is not None:
+        msg_mgr.log_info(f"Frames by detection schedule --> {scheduler.stats()}")
     sqam.end(output_path)
-    cv2.destroyAllWindows()
-
-
+    if decoder is not None:
+        decoder.close()
+    msg_mgr.close()
+    if show_frames:
+        cv2.destroyAllWindows()
@@ -0,0 +1,67 @@
+import os
+import argparse
+import time
+from collections import Counter
+from utils import load_config, get_msg_mgr, DetectionLog
+from classes import SQAM
+import sys
+
+
+# Function to feed every frame of a detection log to SQAM and summarize its results
+def replay_detections(detection_log, sqam, msg_mgr = None):
+    summary = {"frames": 0, "valid_sequences": 0, "exclusions": Counter(), "angles": []}
+    for boxes, track_ids, _ in detection_log:
+        sqam.process_new_frame(None, boxes, track_ids.tolist()) # No video frames are available in replay
+        if msg_mgr is not None:
+            msg_mgr.log_system_info(sqam.tracking_dict, sqam.exclusion_dict, sqam.complete_sequence_dict)
+        summary["frames"] += 1
+        summary["valid_sequences"] += len(sqam.complete_sequence_dict)
+        for exclusion in sqam.exclusion_dict:
+            summary["exclusions"][exclusion["reason"].split(' (')[0]] += 1 # Group by reason, without the measured values
+        for complete_sequence in sqam.complete_sequence_dict:
+            summary["angles"].append(complete_sequence["angle"])
+    return summary
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded detections through SQAM without YOLO or video decoding.')
+    parser.add_argument('--detections', required=True, help="path of the recorded detections (outputs/acquisition_system/detections/<name>)")
+    parser.add_argument('--log_frames', action='store_true', help="log the system state of every frame (slower)")
+    opt = parser.parse_args()
+
+    # Load configuration file and prepare output directory
+    cfg_path = os.path.abspath('acquisition_system/configs/system.yaml')
+    output_path = "outputs/acquisition_system/replay/"
+    cfg = load_config(cfg_path)
+    general_cfg = cfg['general_cfg']
+    sqam_cfg = cfg['sqam_cfg']
+
+    # Initialize logging system
+    msg_mgr = get_msg_mgr()
+    msg_mgr.init_logger(output_path, general_cfg['log_to_file'], structured = general_cfg['structured_log'], console_every = general_cfg['console_log_every'])
+    msg_mgr.log_info(f'Config file loaded from {cfg_path}')
+    msg_mgr.log_info(sqam_cfg)
+
+    # Load the recorded detections
+    detection_log = DetectionLog(opt.detections)
+    msg_mgr.log_info(f"Detections loaded from {opt.detections} --> \'frames\': {len(detection_log)}, \'width\': {detection_log.width}, \'height\': {detection_log.height}")
+
+    # Initialize Sequence Quality Analysis Module (SQAM)
+    try:
+        sqam = SQAM(detection_log.height, detection_log.width, **sqam_cfg)
+    except ValueError as e:
+        msg_mgr.log_warning(f"Error while creating the SQAM: {e}")
+        sys.exit()
+    msg_mgr.log_info('Start Replay!')
+    msg_mgr.reset_time()
+
+    # Replay the detections
+    start = time.time()
+    summary = replay_detections(detection_log, sqam, msg_mgr if opt.log_frames else None)
+    elapsed = time.time() - start
+    msg_mgr.log_info(f"Replayed {summary['frames']} frames in {elapsed:.2f}s ({summary['frames'] / max(elapsed, 1e-9):.0f} frames/s)")
+    msg_mgr.log_info(f"Valid sequences: {summary['valid_sequences']}, angles: {summary['angles']}")
+    msg_mgr.log_info(f"Exclusions: {dict(summary['exclusions'])}")
+    sqam.end(output_path)
+    msg_mgr.close()
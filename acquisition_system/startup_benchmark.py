@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+from utils import load_config
+
+
+HEAVY_MODULES = ["ultralytics", "torch", "matplotlib", "sklearn"] # Modules that dominate the cold start when loaded
+
+# Startup probes: (code run in a fresh interpreter, heavy modules it must not load).
+# The code can set 'extra' to report more values
+PROBES = {
+    "interpreter": ("pass", HEAVY_MODULES),
+    "import_utils": ("import utils", HEAVY_MODULES),
+    "import_sqam": ("from classes import SQAM", HEAVY_MODULES),
+    "import_replay": ("import replay", HEAVY_MODULES),
+    "import_sweep": ("import sweep", HEAVY_MODULES),
+    "import_main": ("import main", HEAVY_MODULES),
+    "sqam_init": ("from classes import SQAM\n"
+                  "SQAM(1080, 1920, **sqam_cfg)", HEAVY_MODULES), # matplotlib is allowed with 'diagrams: true'
+    "model_load": ("from main import load_model\n"
+                   "_, extra = load_model(model_path)", []),
+}
+
+PROBE_TEMPLATE = """import sys, time, json
+sys.path.insert(0, {code_path!r})
+sqam_cfg = {sqam_cfg!r}
+model_path = {model_path!r}
+extra = {{}}
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed_s": elapsed, "extra": extra, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+
+def run_probe(name, sqam_cfg, model_path, repeat):
+    """Runs a startup probe 'repeat' times, each in a new interpreter, and returns its timings.
+    Args:
+        name (str): Name of the probe in PROBES.
+        sqam_cfg (dict): SQAM parameters of the 'sqam_init' probe (matplotlib is expected there with 'diagrams: true').
+        model_path (str): YOLO model loaded by the 'model_load' probe.
+        repeat (int): Number of runs; the median and the minimum are reported.
+    """
+
+    code, forbidden = PROBES[name]
+    source = PROBE_TEMPLATE.format(code_path=os.path.dirname(os.path.abspath(__file__)), sqam_cfg=sqam_cfg, model_path=model_path,
+                                   code=code, heavy=HEAVY_MODULES)
+    if name == "sqam_init":
+        forbidden = [module for module in forbidden if module != "matplotlib" or not sqam_cfg['diagrams']]
+    process_times, elapsed_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", source], capture_output=True, text=True)
+        process_times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit code {result.returncode}"}
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        elapsed_times.append(probe["elapsed_s"])
+    return {"median_s": round(float(np.median(elapsed_times)), 4), "min_s": round(min(elapsed_times), 4),
+            "process_median_s": round(float(np.median(process_times)), 4), **probe["extra"],
+            "loaded": probe["loaded"], "unexpected": [module for module in probe["loaded"] if module in forbidden]}
+
+
+
+def compare_to_baseline(results, baseline, tolerance, slack):
+    # Names of the probes that are slower than in the baseline by more than 'tolerance' (relative) plus 'slack' (seconds)
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name, {})
+        if "median_s" in result and "median_s" in previous and result["median_s"] > previous["median_s"] * (1 + tolerance) + slack:
+            regressions.append(name)
+    return regressions
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the cold-start time of the acquisition system (imports, SQAM creation and model loading).')
+    parser.add_argument('--probes', nargs='+', default=list(PROBES), choices=list(PROBES), help="probes to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs of each probe, each in a new interpreter")
+    parser.add_argument('--baseline', default=None, help="results of a previous run (.json) to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown with respect to the baseline")
+    parser.add_argument('--slack', type=float, default=0.02, help="allowed absolute slowdown (seconds) with respect to the baseline")
+    opt = parser.parse_args()
+
+    # Load configuration file and prepare output directory
+    cfg_path = os.path.abspath('acquisition_system/configs/system.yaml')
+    output_path = "outputs/acquisition_system/startup/"
+    cfg = load_config(cfg_path)
+    model_path = cfg['general_cfg']['model_path']
+    os.makedirs(output_path, exist_ok=True)
+
+    # Run every probe
+    results = {}
+    print(f"{'probe':<16}{'median (s)':>12}{'min (s)':>10}{'process (s)':>13}  heavy modules loaded")
+    for name in opt.probes:
+        if name == "model_load" and not os.path.exists(model_path):
+            results[name] = {"error": f"model not found: {model_path}"}
+        else:
+            results[name] = run_probe(name, cfg['sqam_cfg'], model_path, opt.repeat)
+        result = results[name]
+        if "error" in result:
+            print(f"{name:<16}  error: {result['error']}")
+            continue
+        extra = {key: value for key, value in result.items() if key.endswith('_s') and key not in ("median_s", "min_s", "process_median_s")}
+        print(f"{name:<16}{result['median_s']:>12.3f}{result['min_s']:>10.3f}{result['process_median_s']:>13.3f}  {', '.join(result['loaded']) or '-'}"
+              + (f"  {extra}" if extra else ""))
+
+    # Save the results (usable as the baseline of the next run)
+    output_file = os.path.join(output_path, time.strftime('%Y-%m-%d-%H-%M-%S') + '.json')
+    with open(output_file, 'w') as f:
+        json.dump({"python": sys.version.split()[0], "repeat": opt.repeat, "results": results}, f, indent=2)
+    print(f"Results saved in {output_file}")
+
+    # Fail on heavy imports in the wrong place or on slowdowns with respect to the baseline
+    failed = False
+    for name, result in results.items():
+        if result.get("unexpected"):
+            print(f"Regression: '{name}' loads {', '.join(result['unexpected'])}")
+            failed = True
+    if opt.baseline is not None:
+        with open(opt.baseline, 'r') as f:
+            baseline = json.load(f)["results"]
+        for name in compare_to_baseline(results, baseline, opt.tolerance, opt.slack):
+            print(f"Regression: '{name}' takes {results[name]['median_s']:.3f}s (baseline {baseline[name]['median_s']:.3f}s)")
+            failed = True
+    sys.exit(1 if failed else 0)
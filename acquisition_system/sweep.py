@@ -0,0 +1,120 @@
+import os
+import csv
+import itertools
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+import numpy as np
+import tqdm
+from utils import load_config, DetectionLog
+from classes import SQAM
+from replay import replay_detections
+
+
+EXCLUSION_REASONS = ["Tracking Discontinuity", "Zero Variance", "Direction Change", "Below Minimum Speed", "Reversed Direction"]
+ANGLE_BINS = list(range(0, 361, 45)) # Bins of the angle distribution (degrees)
+
+detection_logs = {} # Detection logs opened by each worker (memory-mapped, so shared through the page cache)
+
+
+
+def sample_configurations(parameters, search, num_samples, seed):
+    """Builds the SQAM configurations to evaluate.
+    Args:
+        parameters (dict): Values of each parameter, as a list or as a {min, max} range (only for random search).
+        search (str): 'grid' for every combination of the lists, 'random' for 'num_samples' random configurations.
+        num_samples (int): Number of configurations of the random search.
+        seed (int): Seed of the random search.
+    """
+
+    if search == 'grid':
+        names = list(parameters)
+        return [dict(zip(names, values)) for values in itertools.product(*(parameters[name] for name in names))]
+    if search != 'random':
+        raise ValueError(f"Unknown search '{search}' (use 'grid' or 'random').")
+    rng = random.Random(seed)
+    configurations = []
+    for _ in range(num_samples):
+        configuration = {}
+        for name, values in parameters.items():
+            if isinstance(values, dict):
+                if isinstance(values['min'], int) and isinstance(values['max'], int):
+                    configuration[name] = rng.randint(values['min'], values['max'])
+                else:
+                    configuration[name] = rng.uniform(values['min'], values['max'])
+            else:
+                configuration[name] = rng.choice(values)
+        configurations.append(configuration)
+    return configurations
+
+
+
+def evaluate_configuration(task):
+    """Replays every detection log through a SQAM with the given configuration and aggregates the results."""
+
+    configuration, detection_paths = task
+    summary = {"frames": 0, "valid_sequences": 0, "exclusions": Counter(), "angles": []}
+    for path in detection_paths:
+        if path not in detection_logs:
+            detection_logs[path] = DetectionLog(path)
+        detection_log = detection_logs[path]
+        sqam = SQAM(detection_log.height, detection_log.width, **{**configuration, "diagrams": False})
+        stream_summary = replay_detections(detection_log, sqam)
+        summary["frames"] += stream_summary["frames"]
+        summary["valid_sequences"] += stream_summary["valid_sequences"]
+        summary["exclusions"].update(stream_summary["exclusions"])
+        summary["angles"].extend(stream_summary["angles"])
+    return configuration, summary
+
+
+
+def sweep(detection_paths, configurations, output_file, workers=1):
+    """Evaluates SQAM configurations over recorded detections using parallel workers and saves one row per configuration.
+    Args:
+        detection_paths (list): Paths of the recorded detection logs.
+        configurations (list): SQAM configurations (dicts of constructor parameters).
+        output_file (str): Path of the CSV file with the results.
+        workers (int): Number of parallel workers to use.
+    """
+
+    # Discard configurations that do not respect the SQAM constraints
+    valid_configurations = []
+    for configuration in configurations:
+        try:
+            SQAM.validate_parameters(**configuration)
+            valid_configurations.append(configuration)
+        except ValueError as e:
+            print(f"Skipping {configuration}: {e}")
+
+    names = list(configurations[0]) if configurations else []
+    angle_columns = [f"angles_{start}_{end}" for start, end in zip(ANGLE_BINS[:-1], ANGLE_BINS[1:])]
+    header = names + ["frames", "valid_sequences"] + EXCLUSION_REASONS + angle_columns + ["mean_angle"]
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w', newline='') as csv_file, Pool(processes=workers) as pool:
+        writer = csv.writer(csv_file)
+        writer.writerow(header)
+        tasks = [(configuration, detection_paths) for configuration in valid_configurations]
+        for configuration, summary in tqdm.tqdm(pool.imap_unordered(evaluate_configuration, tasks), total=len(tasks), desc='Sweeping', unit='cfg'):
+            angle_counts, _ = np.histogram(summary["angles"], bins=ANGLE_BINS)
+            mean_angle = f"{np.mean(summary['angles']):.1f}" if summary["angles"] else ""
+            writer.writerow([configuration[name] for name in names] + [summary["frames"], summary["valid_sequences"]]
+                            + [summary["exclusions"][reason] for reason in EXCLUSION_REASONS] + angle_counts.tolist() + [mean_angle])
+    return len(valid_configurations)
+
+
+
+if __name__ == '__main__':
+    # Load config file .yaml
+    cfg_path = os.path.abspath('acquisition_system/configs/sweep.yaml')
+    output_path = "outputs/acquisition_system/sweep/"
+    print(f"Loading {cfg_path} ...")
+    cfg = load_config(cfg_path)
+    sweep_cfg = cfg['sweep_cfg']
+
+    configurations = sample_configurations(cfg['parameters'], sweep_cfg['search'], sweep_cfg['num_samples'], sweep_cfg['seed'])
+    output_file = os.path.join(output_path, time.strftime('%Y-%m-%d-%H-%M-%S') + '.csv')
+    start = time.time()
+    num_evaluated = sweep(sweep_cfg['detections'], configurations, output_file, sweep_cfg['num_workers'])
+    print(f"\n{num_evaluated} configurations evaluated in {time.time() - start:.1f}s")
+    print(f"Results saved in {output_file}")
@@ -1,3 +1,14 @@
 from .common import load_config
 from .common import get_color_for_id
-from .msg_manager import get_msg_mgr
\ No newline at end of file
+from .exported_models import EXPORTED_MODELS, get_exported_path
+from .msg_manager import get_msg_mgr
+from .pipeline import Pipeline, Stage, StageQueue, STOP
+from .detection_log import DetectionLog, DetectionLogWriter
+from .tracking import create_trackers, track_batch
+from .profiler import get_profiler
+from .sequence_exporter import SequenceExporter
+from .sequence_store import SequenceStore, SequenceStoreWriter
+from .track_trails import TrackTrails
+from .video_encoder import VideoEncoder
+from .frame_ring import FrameRing, SharedFrame, DecoderProcess
+from .scheduler import DetectionScheduler
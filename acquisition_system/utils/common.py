@@ -1,5 +1,6 @@
 import yaml
 import numpy as np
+from functools import lru_cache
 
 # Function to load config .yaml
 def load_config(config_path):
@@ -7,7 +8,7 @@ def load_config(config_path):
         config = yaml.safe_load(file)
     return config
 
-# Function to generate consistent colors for each ID
+# Function to generate consistent colors for each ID (cached, and with its own generator so the global RNG state is not touched)
+@lru_cache(maxsize=4096)
 def get_color_for_id(track_id):
-    np.random.seed(track_id)
-    return tuple(np.random.randint(0, 255, size=3).tolist())
+    return tuple(np.random.RandomState(track_id).randint(0, 255, size=3).tolist())
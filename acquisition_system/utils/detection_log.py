@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+
+
+# Columns of the detection log: (file name, data type, values per detection)
+COLUMNS = {
+    'boxes': ('boxes.bin', np.float32, 4),
+    'track_ids': ('track_ids.bin', np.int32, 1),
+    'confidences': ('confidences.bin', np.float32, 1),
+}
+
+
+class DetectionLogWriter:
+    def __init__(self, path, height, width, fps):
+        # Columnar binary log of the detections of every frame, written incrementally
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta = {"height": height, "width": width, "fps": fps}
+        self.files = {name: open(os.path.join(path, file_name), 'wb') for name, (file_name, _, _) in COLUMNS.items()}
+        self.offsets_file = open(os.path.join(path, 'offsets.bin'), 'wb') # Index of the first detection of each frame
+        self.num_frames = 0
+        self.num_detections = 0
+        np.array([0], dtype=np.int64).tofile(self.offsets_file)
+
+
+    def add_frame(self, boxes, track_ids, confidences):
+        # Append the detections of a new frame
+        for name, values in (('boxes', boxes), ('track_ids', track_ids), ('confidences', confidences)):
+            np.asarray(values, dtype=COLUMNS[name][1]).tofile(self.files[name])
+        self.num_frames += 1
+        self.num_detections += len(track_ids)
+        np.array([self.num_detections], dtype=np.int64).tofile(self.offsets_file)
+
+
+    def close(self):
+        # Flush the columns and write the metadata file
+        for file in list(self.files.values()) + [self.offsets_file]:
+            file.close()
+        self.meta.update({"num_frames": self.num_frames, "num_detections": self.num_detections})
+        with open(os.path.join(self.path, 'meta.json'), 'w') as meta_file:
+            json.dump(self.meta, meta_file)
+
+
+
+class DetectionLog:
+    def __init__(self, path):
+        # Memory-mapped reader of a detection log written by DetectionLogWriter
+        with open(os.path.join(path, 'meta.json'), 'r') as meta_file:
+            self.meta = json.load(meta_file)
+        self.path = path
+        self.height = self.meta['height']
+        self.width = self.meta['width']
+        self.fps = self.meta['fps']
+        self.offsets = self.map('offsets.bin', np.int64, (self.meta['num_frames'] + 1,))
+        for name, (file_name, dtype, size) in COLUMNS.items():
+            shape = (self.meta['num_detections'], size) if size > 1 else (self.meta['num_detections'],)
+            setattr(self, name, self.map(file_name, dtype, shape))
+
+
+    def map(self, file_name, dtype, shape):
+        # Memory-map a column (empty columns cannot be mapped)
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, file_name), dtype=dtype, mode='r', shape=shape)
+
+
+    def __len__(self):
+        return self.meta['num_frames']
+
+
+    def frame(self, index):
+        # Detections of a frame as (boxes, track_ids, confidences) views
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.boxes[start:end], self.track_ids[start:end], self.confidences[start:end]
+
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.frame(index)
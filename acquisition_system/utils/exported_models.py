@@ -0,0 +1,17 @@
+import os
+
+# Paths of the models exported by Ultralytics from some weights ('<stem>.pt'), in the order preferred on CPU
+# (shared by the exporter, object_detector/Yolo/run_model.py, and the loader, main.py). This module only depends on the standard
+# library, so that the exporter can load it by its path without importing the rest of the acquisition system
+EXPORTED_MODELS = {
+    "openvino_int8": "{stem}_int8_openvino_model",
+    "openvino": "{stem}_openvino_model",
+    "onnx": "{stem}.onnx",
+    "torchscript": "{stem}.torchscript",
+}
+
+# Function to get the path of the model exported from some weights in a format ('pytorch' for the weights themselves)
+def get_exported_path(weights_path, model_format):
+    if model_format == 'pytorch':
+        return weights_path
+    return EXPORTED_MODELS[model_format].format(stem=os.path.splitext(weights_path)[0])
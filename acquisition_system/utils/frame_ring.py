@@ -0,0 +1,174 @@
+import queue
+import signal
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+
+class SharedFrame(np.ndarray):
+    # Frame stored in a slot of a FrameRing. Holders call retain()/release() so that the slot is not overwritten
+    # while it is still in use; arrays derived from it (slices, copies) are plain frames
+    def __array_finalize__(self, obj):
+        self.ring = None
+        self.slot = None
+
+
+    def retain(self):
+        self.ring.retain(self.slot)
+
+
+    def release(self):
+        self.ring.release(self.slot)
+
+
+
+class FrameRing:
+    def __init__(self, shape, num_slots = 16, dtype = np.uint8):
+        # Ring of frame slots in shared memory, written by a decoder process and read by slot index in this process.
+        # Each slot has a reference count: the decoder only writes into slots that nobody references
+        self.shape = tuple(shape)
+        self.num_slots = num_slots
+        self.dtype = np.dtype(dtype)
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=num_slots * (frame_bytes + 4))
+        self.free = mp.Semaphore(num_slots) # Number of slots without references
+        self.ready = mp.Queue() # Indices of the written slots, in order (None at the end of the video)
+        self.stop_event = mp.Event()
+        self.lock = threading.Lock() # Reference counts are only changed by the threads of this process (and by the decoder while a slot is free)
+        self.owner = True
+        self.attach()
+
+
+    def attach(self):
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.frames = np.ndarray((self.num_slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        self.refs = np.ndarray(self.num_slots, dtype=np.int32, buffer=self.shm.buf, offset=self.num_slots * frame_bytes)
+        if self.owner:
+            self.refs[:] = 0
+
+
+    def __getstate__(self):
+        # Sent to the decoder process: the shared memory is attached there by name
+        state = self.__dict__.copy()
+        for name in ('frames', 'refs', 'lock'):
+            del state[name]
+        state['shm'] = self.shm.name
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=state['shm'])
+        self.lock = threading.Lock()
+        self.owner = False
+        self.attach()
+
+
+    # Decoder side
+    def reserve(self):
+        # Wait for a slot without references and return its index (None if a stop was requested)
+        while not self.free.acquire(timeout=0.1):
+            if self.stop_event.is_set():
+                return None
+        return int(np.flatnonzero(self.refs == 0)[0])
+
+
+    def publish(self, slot):
+        # Make a written slot available to the reader, which owns its first reference
+        self.refs[slot] = 1
+        self.ready.put(slot)
+
+
+    # Reader side
+    def get(self, timeout = None):
+        # Next decoded frame as a SharedFrame (None at the end of the video, queue.Empty after 'timeout' seconds)
+        slot = self.ready.get(timeout=timeout)
+        if slot is None:
+            return None
+        frame = self.frames[slot].view(SharedFrame)
+        frame.ring, frame.slot = self, slot
+        return frame
+
+
+    def retain(self, slot):
+        with self.lock:
+            self.refs[slot] += 1
+
+
+    def release(self, slot):
+        with self.lock:
+            self.refs[slot] -= 1
+            if self.refs[slot] == 0:
+                self.free.release() # The decoder can overwrite the slot
+
+
+    def close(self):
+        # Stop the decoder and free the shared memory. The reader only removes its name: the memory stays mapped
+        # while frames of the ring are referenced (e.g. by LastFrames) and is unmapped with the last of them
+        self.stop_event.set()
+        if self.owner:
+            self.shm.unlink()
+        else:
+            self.frames = self.refs = None
+            self.shm.close()
+
+
+
+# Decoder process: reads the video directly into free slots of the ring (no copies between processes)
+def decode_to_ring(input_video_path, ring):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Stops are requested by the main process
+    ring.owner = False
+    cap = cv2.VideoCapture(input_video_path)
+    frame = None
+    try:
+        while not ring.stop_event.is_set():
+            slot = ring.reserve()
+            if slot is None:
+                break
+            success, frame = cap.read(ring.frames[slot])
+            if not success:
+                ring.free.release()
+                break
+            if frame.ctypes.data != ring.frames[slot].ctypes.data: # Not decoded in place (e.g. another size)
+                ring.frames[slot] = frame
+            ring.publish(slot)
+    finally:
+        del frame
+        cap.release()
+        ring.ready.put(None)
+        ring.close()
+
+
+
+class DecoderProcess:
+    def __init__(self, input_video_path, shape, num_slots = 16):
+        # Decoder running in its own process, connected through a shared-memory FrameRing
+        self.ring = FrameRing(shape, num_slots)
+        self.process = mp.Process(target=decode_to_ring, args=(input_video_path, self.ring), name='decode', daemon=True)
+        self.process.start()
+
+
+    def frames(self, stop_event = None):
+        # Generator of the decoded frames (SharedFrame, with one reference owned by the caller)
+        while not (stop_event is not None and stop_event.is_set()):
+            try:
+                frame = self.ring.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive() and self.ring.ready.empty(): # The decoder died
+                    break
+                continue
+            if frame is None:
+                break
+            yield frame
+
+
+    def close(self):
+        # Stop the decoder, wait for it and free the shared memory
+        self.ring.stop_event.set()
+        while self.process.is_alive():
+            while not self.ring.ready.empty(): # The decoder only exits once the slots it published are read
+                self.ring.ready.get_nowait()
+            self.process.join(0.1)
+        self.ring.close()
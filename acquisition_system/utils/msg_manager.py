@@ -1,7 +1,76 @@
 import time
 import logging
+from logging.handlers import QueueListener
 from time import strftime, localtime
 import os
+import json
+import queue
+
+
+class EventHandler(logging.Handler):
+    def __init__(self, logger, events_path = None, console_every = 25, flush_every = 100):
+        # Writes the per-frame events as JSON Lines and logs a summary every 'console_every' frames
+        super().__init__()
+        self.logger = logger
+        self.events_file = open(events_path, 'w') if events_path else None
+        self.console_every = console_every
+        self.flush_every = flush_every # Number of events written between flushes
+        self.pending = 0
+        self.reset_summary()
+
+
+    def reset_summary(self):
+        self.summary = {"first_frame": None, "frames": 0, "cost_ms": 0.0, "max_cost_ms": 0.0, "detections": 0,
+                        "new_entries": 0, "exclusions": 0, "valid_sequences": 0, "angles": []}
+
+
+    def handle(self, event):
+        # Events are not LogRecords, so filters and levels are skipped
+        self.emit(event)
+
+
+    def emit(self, event):
+        iteration, timestamp, cost_ms, tracking_dict, exclusion_dict, complete_sequence_dict = event
+        if self.events_file is not None:
+            record = {"frame": iteration, "time": round(timestamp, 3), "cost_ms": round(cost_ms, 2), **tracking_dict,
+                      "exclusions": exclusion_dict, "completions": complete_sequence_dict}
+            self.events_file.write(json.dumps(record) + '\n')
+            self.pending += 1
+            if self.pending >= self.flush_every: # Batched flushes
+                self.events_file.flush()
+                self.pending = 0
+
+        # Accumulate the console summary
+        summary = self.summary
+        if summary["first_frame"] is None:
+            summary["first_frame"] = iteration
+        summary["frames"] += 1
+        summary["cost_ms"] += cost_ms
+        summary["max_cost_ms"] = max(summary["max_cost_ms"], cost_ms)
+        summary["detections"] += tracking_dict["detections_num"]
+        summary["new_entries"] += tracking_dict["new_entries"]
+        summary["exclusions"] += tracking_dict["exclusions_num"]
+        summary["valid_sequences"] += tracking_dict["valid_sequence_num"]
+        summary["angles"].extend(complete_sequence["angle"] for complete_sequence in complete_sequence_dict)
+        if summary["frames"] >= self.console_every:
+            self.log_summary(iteration)
+
+
+    def log_summary(self, iteration):
+        summary = self.summary
+        if summary["frames"]:
+            self.logger.info(f"Frames {summary['first_frame']:05}-{iteration:05}, Mean cost {summary['cost_ms'] / summary['frames']:.2f}ms, "
+                             f"Max cost {summary['max_cost_ms']:.2f}ms, detections: {summary['detections']}, new_entries: {summary['new_entries']}, "
+                             f"exclusions: {summary['exclusions']}, valid_sequences: {summary['valid_sequences']}, angles: {summary['angles']}")
+        self.reset_summary()
+
+
+    def close(self):
+        if self.summary["frames"]:
+            self.log_summary(self.summary["first_frame"] + self.summary["frames"] - 1)
+        if self.events_file is not None:
+            self.events_file.close()
+        super().close()
 
 
 class MessageManager:
@@ -9,15 +78,19 @@ class MessageManager:
         # Initialize time and iteration counter
         self.time = time.time()
         self.iteration = 0
+        self.listener = None # Writer thread of the structured events (only used with 'structured')
 
 
-    def init_logger(self, save_path, log_to_file):
-        # Configure logging system
-        self.logger = logging.getLogger('acquisition_system')
+    def init_logger(self, save_path, log_to_file, name = None, structured = False, console_every = 25):
+        # Configure logging system ('name' identifies the stream in multi-stream mode).
+        # With 'structured', the per-frame system info is queued as events and written by a separate thread
+        # (JSON Lines file + console summary every 'console_every' frames)
+        self.logger = logging.getLogger('acquisition_system' if name is None else f'acquisition_system.{name}')
         self.logger.setLevel(logging.INFO)
         self.logger.propagate = False
         formatter = logging.Formatter(
-            fmt='[%(asctime)s] [%(levelname)s]: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+            fmt='[%(asctime)s] [%(levelname)s]: %(message)s' if name is None else f'[%(asctime)s] [%(levelname)s] [{name}]: %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S')
         if log_to_file:
             os.makedirs(os.path.join(save_path, "logs"), exist_ok=True)
             vlog = logging.FileHandler(
@@ -31,11 +104,25 @@ class MessageManager:
         console.setLevel(logging.DEBUG)
         self.logger.addHandler(console)
 
+        if structured:
+            events_path = None
+            if log_to_file:
+                events_path = os.path.join(save_path, "logs", strftime('%Y-%m-%d-%H-%M-%S', localtime())+'.jsonl')
+            self.events = queue.SimpleQueue()
+            self.event_handler = EventHandler(self.logger, events_path, console_every)
+            self.listener = QueueListener(self.events, self.event_handler)
+            self.listener.start()
+
 
     def log_system_info(self, tracking_dict, exclusion_dict, complete_sequence_dict):
         # Log system state details
         now = time.time()
         self.iteration += 1
+        if self.listener is not None:
+            # Structured mode: only enqueue the event (SQAM creates new dicts every frame, so no copy is needed)
+            self.events.put((self.iteration, now, (now - self.time) * 1000, tracking_dict, exclusion_dict, complete_sequence_dict))
+            self.reset_time()
+            return
         tracking_info = ", ".join(f"{key}: {value}" for key, value in tracking_dict.items())
         header = f"Frame {self.iteration:05}, Cost {(now - self.time) * 1000:.2f}ms, {tracking_info}"
         if exclusion_dict:
@@ -61,6 +148,14 @@ class MessageManager:
         self.time = time.time()
 
 
+    def close(self):
+        # Write the remaining structured events and stop the writer thread
+        if self.listener is not None:
+            self.listener.stop()
+            self.event_handler.close()
+            self.listener = None
+
+
     def log_debug(self, *args, **kwargs):
         self.logger.debug(*args, **kwargs)
 
@@ -75,6 +170,11 @@ class MessageManager:
 
 # Global MessageManager instance
 msg_mgr = MessageManager()
-
-def get_msg_mgr():
-    return msg_mgr
\ No newline at end of file
+stream_msg_mgrs = {} # MessageManager instance of each stream in multi-stream mode
+
+def get_msg_mgr(name = None):
+    if name is None:
+        return msg_mgr
+    if name not in stream_msg_mgrs:
+        stream_msg_mgrs[name] = MessageManager()
+    return stream_msg_mgrs[name]
\ No newline at end of file
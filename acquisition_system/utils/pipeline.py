@@ -0,0 +1,138 @@
+import threading
+import queue
+
+
+STOP = object() # Sentinel sent through the queues when a stage finishes
+
+
+class StageQueue:
+    def __init__(self, max_size = 8, policy = 'block', on_drop = None):
+        # Bounded queue between two stages with a backpressure policy ('on_drop' is called with every discarded item)
+        if policy not in ('block', 'drop_oldest'):
+            raise ValueError(f"Unknown backpressure policy '{policy}' (use 'block' or 'drop_oldest').")
+        self.queue = queue.Queue(max_size)
+        self.policy = policy # 'block': wait for free space; 'drop_oldest': discard the oldest item (live sources)
+        self.dropped = 0 # Number of items discarded by the 'drop_oldest' policy
+        self.on_drop = on_drop
+
+
+    def put(self, item):
+        # Add an item to the queue according to the backpressure policy (STOP is never dropped)
+        if self.policy == 'block' or item is STOP:
+            self.queue.put(item)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self.queue.get_nowait() # Discard the oldest item
+                    self.dropped += 1
+                    if self.on_drop is not None:
+                        self.on_drop(dropped)
+                except queue.Empty:
+                    pass
+
+
+    def get(self):
+        return self.queue.get()
+
+
+    def qsize(self):
+        return self.queue.qsize()
+
+
+
+class Stage(threading.Thread):
+    def __init__(self, name, function, input_queue = None, output_queue = None, stop_event = None, flush = None):
+        # Pipeline stage running on its own thread. Without an input queue, 'function' is an iterable source.
+        # A processing function can return a list of items (e.g. none while it holds its input), and 'flush' gives
+        # the items still held when the input ends
+        super().__init__(name = name, daemon = True)
+        self.function = function
+        self.flush = flush
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.stop_event = stop_event if stop_event is not None else threading.Event() # Set to stop every stage of the pipeline
+        self.error = None # Exception raised by the stage, if any
+
+
+    def emit(self, item):
+        if self.output_queue is None or item is None:
+            return
+        for value in (item if isinstance(item, list) else [item]):
+            self.output_queue.put(value)
+
+
+    def run(self):
+        try:
+            if self.input_queue is None:
+                # Source stage: forward items until it is exhausted or the pipeline is stopped
+                for item in self.function:
+                    if self.stop_event.is_set():
+                        break
+                    self.emit(item)
+            else:
+                # Processing stage: apply the function to every item in order until STOP is received
+                while True:
+                    item = self.input_queue.get()
+                    if item is STOP:
+                        break
+                    self.emit(self.function(item))
+                if self.flush is not None:
+                    self.emit(self.flush())
+        except BaseException as e:
+            self.error = e
+            self.stop_event.set() # Stop the source so that the pipeline drains
+            if self.input_queue is not None:
+                while self.input_queue.get() is not STOP: # Keep consuming so that upstream stages never block
+                    pass
+        finally:
+            if self.output_queue is not None:
+                self.output_queue.put(STOP)
+
+
+
+class Pipeline:
+    def __init__(self):
+        # Chain of stages connected by bounded queues
+        self.stages = []
+        self.queues = {}
+        self.stop_event = threading.Event()
+
+
+    def add_stage(self, name, function, queue_size = None, policy = 'block', on_drop = None, flush = None):
+        # Add a stage fed by the previous one ('function' is an iterable for the first stage).
+        # Returns the output queue of the stage if 'queue_size' is given
+        input_queue = self.stages[-1].output_queue if self.stages else None
+        output_queue = StageQueue(queue_size, policy, on_drop) if queue_size is not None else None
+        if output_queue is not None:
+            self.queues[name] = output_queue
+        self.stages.append(Stage(name, function, input_queue, output_queue, self.stop_event, flush))
+        return output_queue
+
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+
+    def stop(self):
+        # Ask the source to stop; the remaining items are still processed by the following stages
+        self.stop_event.set()
+
+
+    def join(self):
+        # Wait for every stage and re-raise the first error found
+        for stage in self.stages:
+            while stage.is_alive():
+                stage.join(0.1)
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+
+
+    def dropped(self):
+        # Number of items dropped by each queue
+        return {name: output_queue.dropped for name, output_queue in self.queues.items()}
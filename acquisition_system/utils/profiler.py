@@ -0,0 +1,137 @@
+import os
+import json
+import math
+import time
+from contextlib import nullcontext
+from collections import defaultdict
+
+
+NULL_TIMER = nullcontext() # Reusable no-op timer used while the profiler is disabled
+
+
+class LatencyHistogram:
+    def __init__(self, sub_buckets = 64):
+        # Log-scale histogram (HDR-style): 'sub_buckets' buckets per power of two, i.e. ~1% relative precision
+        self.sub_buckets = sub_buckets
+        self.counts = defaultdict(int) # Bucket index -> number of values
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.counts[math.floor(math.log2(max(seconds, 1e-9)) * self.sub_buckets)] += 1
+
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th percentile (never above the maximum value)
+        target = q / 100 * self.count
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if cumulative >= target:
+                return min(2 ** ((index + 1) / self.sub_buckets), self.max)
+        return self.max
+
+
+
+class Timer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+
+class Profiler:
+    def __init__(self):
+        # Named stage timers with latency histograms (disabled until configured)
+        self.enabled = False
+        self.histograms = {}
+        self.frames = 0
+        self.start = time.perf_counter()
+
+
+    def configure(self, enabled, output_path, msg_mgr, dump_every = 1000):
+        # Enable the profiler; every 'dump_every' frames the summary is logged and saved in 'output_path'
+        self.enabled = enabled
+        self.output_path = output_path
+        self.msg_mgr = msg_mgr
+        self.dump_every = dump_every
+        self.histograms = {}
+        self.frames = 0
+        self.start = time.perf_counter()
+
+
+    def timer(self, name):
+        # Context manager that records the time spent in a stage (no-op if disabled)
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name)
+
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.record(seconds)
+
+
+    def tick(self):
+        # Count a processed frame and dump the summary periodically
+        if not self.enabled:
+            return
+        self.frames += 1
+        if self.dump_every and self.frames % self.dump_every == 0:
+            self.report()
+
+
+    def summary(self):
+        # Statistics of each stage in milliseconds, and FPS the stage could sustain alone
+        stages = {}
+        for name, histogram in sorted(self.histograms.items()):
+            stages[name] = {
+                "count": histogram.count,
+                "mean_ms": histogram.total / histogram.count * 1000,
+                "p50_ms": histogram.percentile(50) * 1000,
+                "p95_ms": histogram.percentile(95) * 1000,
+                "p99_ms": histogram.percentile(99) * 1000,
+                "max_ms": histogram.max * 1000,
+                "fps": histogram.count / histogram.total if histogram.total else 0.0
+            }
+        return {"frames": self.frames, "elapsed_s": time.perf_counter() - self.start, "stages": stages}
+
+
+    def report(self):
+        # Log the summary as a table and save it as JSON
+        if not self.enabled:
+            return
+        summary = self.summary()
+        lines = [f"Profile after {summary['frames']} frames ({summary['elapsed_s']:.1f}s):",
+                 f"{'stage':<34}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'fps':>10}"]
+        for name, stage in summary["stages"].items():
+            lines.append(f"{name:<34}{stage['count']:>8}{stage['mean_ms']:>10.3f}{stage['p50_ms']:>10.3f}{stage['p95_ms']:>10.3f}"
+                         f"{stage['p99_ms']:>10.3f}{stage['max_ms']:>10.3f}{stage['fps']:>10.1f}")
+        self.msg_mgr.log_info("\n                      ".join(lines))
+        os.makedirs(self.output_path, exist_ok=True)
+        with open(os.path.join(self.output_path, 'profile.json'), 'w') as profile_file:
+            json.dump(summary, profile_file, indent=2)
+
+
+# Global Profiler instance
+profiler = Profiler()
+
+def get_profiler():
+    return profiler
@@ -0,0 +1,82 @@
+class DetectionScheduler:
+    def __init__(self, idle_after = 25, idle_stride = 1, idle_imgsz = None, imgsz = 640):
+        # Decides how each frame goes through the detector. While the scene is empty (no detections and nobody tracked by SQAM
+        # for 'idle_after' frames), only one of every 'idle_stride' frames is detected, at 'idle_imgsz' if given, and the detection
+        # of the others is deferred. If that frame detects anything, the deferred frames and that frame are detected again at full
+        # resolution, so no frame of a person is missed; otherwise the deferred frames are passed on without detections.
+        # Detection stays at every frame at full resolution while there are detections or anyone tracked by SQAM (accumulating toward 'n' frames)
+        if idle_after < 1:
+            raise ValueError("Value of 'idle_after' must be greater than or equal to 1.")
+        if idle_stride < 1:
+            raise ValueError("Value of 'idle_stride' must be greater than or equal to 1.")
+        self.idle_after = idle_after
+        self.idle_stride = idle_stride
+        self.idle_overrides = {"imgsz": idle_imgsz} if idle_imgsz else {} # Arguments of the detector replaced while idle
+        self.full_overrides = {"imgsz": imgsz} if idle_imgsz else {} # Ultralytics keeps the arguments of the previous call, so the full size is given back explicitly
+        self.empty_frames = 0 # Consecutive detected frames without detections
+        self.tracked = 0 # People tracked by SQAM (set by the SQAM stage, may lag behind the detector)
+        self.idle_frames = 0 # Frames since the scene became idle
+        self.probing = False # Whether the last frame to detect is an idle one
+        self.deferred = [] # Frames whose detection was deferred, oldest first (at most 'idle_stride' - 1)
+        self.counts = {"full": 0, "idle": 0, "skipped": 0, "redetected": 0} # Frames by decision
+
+
+    @property
+    def idle(self):
+        return self.empty_frames >= self.idle_after and self.tracked == 0
+
+
+    def next_frame(self):
+        # Arguments of the detector to replace for the next frame, or None to defer its detection (see 'defer')
+        if not self.idle:
+            self.idle_frames = 0
+            self.probing = False
+            return self.full_overrides
+        self.idle_frames += 1
+        if (self.idle_frames - 1) % self.idle_stride:
+            return None
+        self.probing = True
+        return self.idle_overrides
+
+
+    def defer(self, frame):
+        # Keep a frame whose detection was deferred until the next detected frame
+        self.deferred.append(frame)
+
+
+    def keep_size(self):
+        # Detect idle frames at the full size too (for models with a fixed input size)
+        self.idle_overrides = {}
+        self.full_overrides = {}
+
+
+    def observe(self, detections_num):
+        # Number of objects detected (tracked or not yet confirmed by the tracker) in the last detected frame.
+        # Returns the deferred frames, and whether they must be detected again, followed by the last frame, at full resolution
+        self.empty_frames = 0 if detections_num else self.empty_frames + 1
+        if not self.probing:
+            self.counts["full"] += 1
+            return [], False
+        deferred, self.deferred = self.deferred, []
+        if detections_num and (deferred or self.idle_overrides):
+            self.counts["redetected"] += len(deferred) + 1
+            return deferred, True
+        self.counts["idle"] += 1
+        self.counts["skipped"] += len(deferred)
+        return deferred, False
+
+
+    def flush(self):
+        # Deferred frames left when the video ends (never detected)
+        deferred, self.deferred = self.deferred, []
+        self.counts["skipped"] += len(deferred)
+        return deferred
+
+
+    def set_tracked(self, tracked_num):
+        # Number of people tracked by SQAM after its last frame
+        self.tracked = tracked_num
+
+
+    def stats(self):
+        return dict(self.counts)
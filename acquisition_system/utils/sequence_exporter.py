@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import threading
+import cv2
+import numpy as np
+from .pipeline import StageQueue, STOP
+from .sequence_store import SequenceStoreWriter
+
+
+# Writers of the per-sequence artifacts: function(path, frames, fps) -> path of the written artifact
+def write_npz(path, frames, fps):
+    # Compressed NumPy tensor (n, H, W, C), or one array per frame if the crops have different shapes
+    path += '.npz'
+    if len({frame.shape for frame in frames}) == 1:
+        np.savez_compressed(path, frames=np.stack(frames))
+    else:
+        np.savez_compressed(path, **{f"frame_{i:03d}": frame for i, frame in enumerate(frames)})
+    return path
+
+
+def write_jpg(path, frames, fps):
+    # Directory with one JPEG image per frame
+    os.makedirs(path, exist_ok=True)
+    for i, frame in enumerate(frames):
+        cv2.imwrite(os.path.join(path, f"{i:03d}.jpg"), frame)
+    return path
+
+
+def write_mp4(path, frames, fps):
+    # Video clip (frames are resized to the size of the first one)
+    path += '.mp4'
+    height, width = frames[0].shape[:2]
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for frame in frames:
+        out.write(frame if frame.shape[:2] == (height, width) else cv2.resize(frame, (width, height)))
+    out.release()
+    return path
+
+
+WRITERS = {'npz': write_npz, 'jpg': write_jpg, 'mp4': write_mp4}
+
+
+
+def open_index(output_path):
+    # Open the index of a previous export to append to it, dropping a partial last line (interrupted run), and return it
+    # with the highest sequence number already used by its entries or by the artifacts in the folder (so they are never overwritten)
+    path = os.path.join(output_path, 'index.jsonl')
+    last_number = 0
+    if os.path.exists(path):
+        with open(path, 'rb+') as f:
+            data = f.read()
+            f.truncate(data.rfind(b'\n') + 1)
+        for line in data[:data.rfind(b'\n') + 1].splitlines():
+            name = json.loads(line)["sequence"].split('_')[0]
+            last_number = max(last_number, int(name)) if name.isdigit() else last_number
+    for entry in os.listdir(output_path):
+        name = entry.split('_')[0]
+        if name.isdigit():
+            last_number = max(last_number, int(name))
+    return open(path, 'a'), last_number
+
+
+
+class SequenceExporter:
+    def __init__(self, output_path, format = 'npz', workers = 2, queue_size = 16, policy = 'block', crop = True, crop_size = None, fps = 25, camera = None):
+        # Pool of background workers that write the valid sequences of SQAM to disk without stalling the tracking loop
+        if not callable(format) and format not in WRITERS and format != 'store':
+            raise ValueError(f"Unknown export format '{format}' (use {', '.join(WRITERS)}, store or a writer function).")
+        if format == 'store' and not crop_size:
+            raise ValueError("The 'store' export format needs a 'crop_size', since every sequence has the same shape.")
+        if workers < 1:
+            raise ValueError("Value of 'workers' must be greater than or equal to 1.")
+        os.makedirs(output_path, exist_ok=True)
+        self.output_path = output_path
+        self.writer = format if callable(format) else WRITERS.get(format)
+        self.camera = camera
+        self.store = None # SequenceStoreWriter of the 'store' format, created with the first sequence
+        self.crop = crop # Whether SQAM exports the person's padded crops instead of whole frames
+        self.crop_size = tuple(crop_size) if crop_size else None # (height, width) to which every frame is resized
+        self.fps = fps
+        self.queue = StageQueue(queue_size, policy) # Bounds the memory used by the sequences waiting to be written
+        self.index_file, self.last_number = open_index(output_path) if self.writer else (None, 0) # One line per written sequence; numbers continue the previous runs
+        self.lock = threading.Lock()
+        self.stats = {"submitted": 0, "written": 0, "failed": 0, "max_queued": 0, "blocked_s": 0.0}
+        self.last_error = None
+        self.workers = [threading.Thread(target=self.work, name=f'export_{i}', daemon=True) for i in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+
+    def submit(self, sequence, frames):
+        # Queue a sequence (metadata dict and its frames, oldest first). Views of shared buffers are copied,
+        # since they are overwritten by the next frames; with the 'block' policy this waits for a free worker
+        frames = [frame if frame.base is None else frame.copy() for frame in frames]
+        with self.lock:
+            self.stats["submitted"] += 1
+            name = f"{self.last_number + self.stats['submitted']:06d}_{sequence['person_id']}"
+        start = time.perf_counter()
+        self.queue.put((name, sequence, frames))
+        with self.lock:
+            self.stats["blocked_s"] += time.perf_counter() - start
+            self.stats["max_queued"] = max(self.stats["max_queued"], self.queue.qsize())
+
+
+    def work(self):
+        # Write queued sequences until STOP is received
+        while (item := self.queue.get()) is not STOP:
+            name, sequence, frames = item
+            try:
+                if self.crop_size is not None:
+                    frames = [cv2.resize(frame, self.crop_size[::-1]) for frame in frames]
+                if self.writer is None:
+                    # Append to the memory-mapped sequence store (one writer at a time)
+                    frames = np.stack(frames)
+                    with self.lock:
+                        if self.store is None:
+                            self.store = SequenceStoreWriter(self.output_path, frames.shape, self.camera)
+                        self.store.append(sequence, frames)
+                        self.stats["written"] += 1
+                else:
+                    path = self.writer(os.path.join(self.output_path, name), frames, self.fps)
+                    entry = {"sequence": name, "path": os.path.relpath(path, self.output_path), **sequence}
+                    with self.lock:
+                        self.index_file.write(json.dumps(entry) + '\n') # Only after the artifact is complete
+                        self.index_file.flush()
+                        self.stats["written"] += 1
+            except Exception as e:
+                with self.lock:
+                    self.stats["failed"] += 1
+                    self.last_error = e
+
+
+    def close(self):
+        # Write every queued sequence, stop the workers and return the export statistics
+        for _ in self.workers:
+            self.queue.put(STOP)
+        for worker in self.workers:
+            worker.join()
+        if self.index_file is not None:
+            self.index_file.close()
+        if self.store is not None:
+            self.store.close()
+        return {**self.stats, "dropped": self.queue.dropped}
@@ -0,0 +1,135 @@
+import os
+import json
+import numpy as np
+
+
+# Record of the index of the sequence store (one per sequence, in order of arrival)
+INDEX_DTYPE = np.dtype([
+    ('person_id', np.int64),
+    ('start_frame', np.int64), # Frame range of the sequence in the stream
+    ('end_frame', np.int64),
+    ('timestamp', np.float64), # Time at which the sequence was completed (seconds since the epoch)
+    ('angle', np.int32),
+    ('first_x', np.int32), ('first_y', np.int32),
+    ('last_x', np.int32), ('last_y', np.int32),
+    ('segment', np.int32), # Segment file and row of the sequence tensor in it
+    ('row', np.int32),
+])
+
+
+class SequenceStoreWriter:
+    def __init__(self, path, shape, camera = None, segment_size = 256):
+        # Append-only store of fixed-shape (n, h, w, c) uint8 sequence tensors, in segment files of 'segment_size' sequences
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.shape = tuple(shape)
+        self.segment_size = segment_size
+        self.meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(self.meta_path): # Continue an existing store
+            with open(self.meta_path, 'r') as meta_file:
+                meta = json.load(meta_file)
+            if tuple(meta['shape']) != self.shape:
+                raise ValueError(f"Sequence store {path} has shape {tuple(meta['shape'])}, not {self.shape}.")
+            self.segment_size = meta['segment_size']
+        else:
+            with open(self.meta_path, 'w') as meta_file:
+                json.dump({"shape": self.shape, "dtype": "uint8", "segment_size": segment_size, "camera": camera}, meta_file)
+        self.index_file = open(os.path.join(path, 'index.bin'), 'ab')
+        self.num_sequences = self.index_file.tell() // INDEX_DTYPE.itemsize
+        self.index_file.truncate(self.num_sequences * INDEX_DTYPE.itemsize) # Drop a partial record left by an interrupted run
+        self.segment_file = None
+        self.segment = -1
+
+
+    def append(self, sequence, frames):
+        # Append the tensor of a sequence (metadata dict, frames of shape 'shape') and its index record
+        frames = np.ascontiguousarray(frames, dtype=np.uint8).reshape(self.shape)
+        segment, row = divmod(self.num_sequences, self.segment_size)
+        if segment != self.segment:
+            if self.segment_file is not None:
+                self.segment_file.close()
+            self.segment_file = open(os.path.join(self.path, f'segment_{segment:05d}.bin'), 'ab')
+            self.segment_file.truncate(row * frames.nbytes) # Drop a partial tensor left by an interrupted run
+            self.segment = segment
+        self.segment_file.write(frames.tobytes())
+        self.segment_file.flush()
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record[0] = (sequence['person_id'], sequence['start_frame'], sequence['end_frame'], sequence['timestamp'], sequence['angle'],
+                     *sequence['first_position'], *sequence['last_position'], segment, row)
+        record.tofile(self.index_file) # Only after the tensor is written, so the index never points to missing data
+        self.index_file.flush()
+        self.num_sequences += 1
+
+
+    def close(self):
+        if self.segment_file is not None:
+            self.segment_file.close()
+        self.index_file.close()
+
+
+
+class SequenceStore:
+    def __init__(self, path):
+        # Memory-mapped reader of a sequence store written by SequenceStoreWriter
+        with open(os.path.join(path, 'meta.json'), 'r') as meta_file:
+            self.meta = json.load(meta_file)
+        self.path = path
+        self.shape = tuple(self.meta['shape'])
+        self.camera = self.meta['camera']
+        index_path = os.path.join(path, 'index.bin')
+        num_sequences = os.path.getsize(index_path) // INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+        self.index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(num_sequences,)) if num_sequences else np.empty(0, dtype=INDEX_DTYPE)
+        self.segments = {} # Segment files mapped on first access
+
+
+    def __len__(self):
+        return len(self.index)
+
+
+    def segment(self, segment):
+        # Memory-map a segment file as an array of sequence tensors
+        if segment not in self.segments:
+            segment_path = os.path.join(self.path, f'segment_{segment:05d}.bin')
+            count = os.path.getsize(segment_path) // int(np.prod(self.shape))
+            self.segments[segment] = np.memmap(segment_path, dtype=np.uint8, mode='r', shape=(count,) + self.shape)
+        return self.segments[segment]
+
+
+    def sequence(self, i):
+        # Zero-copy view of the (n, h, w, c) tensor of the i-th sequence
+        record = self.index[i]
+        return self.segment(int(record['segment']))[int(record['row'])]
+
+
+    def select(self, angles = None, frames = None, times = None):
+        """Returns the positions (in the index) of the sequences that match every given filter.
+        Args:
+            angles (tuple): (min, max) angle range in degrees, inclusive. If min > max the range wraps around 360 (e.g. (315, 45)).
+            frames (tuple): (start, end) frame window; sequences that overlap it are selected.
+            times (tuple): (start, end) time window (seconds since the epoch) in which the sequences were completed.
+        """
+
+        mask = np.ones(len(self.index), dtype=bool)
+        if angles is not None:
+            angle = self.index['angle']
+            low, high = angles
+            mask &= ((angle >= low) & (angle <= high)) if low <= high else ((angle >= low) | (angle <= high))
+        if frames is not None:
+            mask &= (self.index['end_frame'] >= frames[0]) & (self.index['start_frame'] <= frames[1])
+        if times is not None:
+            mask &= (self.index['timestamp'] >= times[0]) & (self.index['timestamp'] <= times[1])
+        return np.flatnonzero(mask)
+
+
+    def sequences(self, indices):
+        # Zero-copy views of the selected sequences
+        for i in indices:
+            yield self.sequence(i)
+
+
+    def batch(self, indices):
+        # Copy the selected sequences into one (k, n, h, w, c) array (e.g. a training batch)
+        batch = np.empty((len(indices),) + self.shape, dtype=np.uint8)
+        for k, i in enumerate(indices):
+            batch[k] = self.sequence(i)
+        return batch
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class TrackTrails:
+    def __init__(self, length = 30, capacity = 64, max_age = None):
+        # Last 'length' positions of each track ID in fixed-size ring arrays. Every point is written twice
+        # (at i and i + length), so the trail is always a contiguous view, oldest point first.
+        # The slots of IDs not seen for 'max_age' frames (default: 'length') are freed and reused by new IDs
+        self.length = length
+        self.max_age = max_age if max_age is not None else length
+        self.slots = {} # Track ID -> slot
+        self.points = np.zeros((capacity, 2 * length, 2), dtype=np.int32)
+        self.next = [] # Ring position of the next point of each slot
+        self.count = [] # Number of points of each slot
+        self.last_seen = [] # Frame in which each slot was last updated
+        self.free = [] # Slots freed by stale IDs
+        self.frame = 0 # Number of frames started
+
+
+    def new_frame(self):
+        # Start a new frame; stale IDs are looked for once every 'max_age' frames, so they are freed within 2 * 'max_age' frames
+        self.frame += 1
+        if self.frame % max(self.max_age, 1):
+            return
+        for track_id, slot in list(self.slots.items()):
+            if self.frame - self.last_seen[slot] > self.max_age:
+                del self.slots[track_id]
+                self.free.append(slot)
+
+
+    def add(self, track_id, x, y):
+        # Add the current position of a track and return its trail (view)
+        slot = self.slots.get(track_id)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+                self.next[slot] = self.count[slot] = 0
+            else:
+                slot = len(self.next)
+                if slot == len(self.points): # Double the capacity
+                    self.points = np.concatenate((self.points, np.zeros_like(self.points)))
+                self.next.append(0)
+                self.count.append(0)
+                self.last_seen.append(0)
+            self.slots[track_id] = slot
+        self.last_seen[slot] = self.frame
+        i = self.next[slot]
+        self.points[slot, i] = self.points[slot, i + self.length] = (x, y)
+        self.next[slot] = (i + 1) % self.length
+        self.count[slot] = min(self.count[slot] + 1, self.length)
+        return self.points[slot, i + self.length - self.count[slot] + 1:i + self.length + 1]
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+# Function to create one independent tracker per stream (same tracker used by YOLO's track())
+def create_trackers(tracker, frame_rates):
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+    tracker_cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker)))
+    return [TRACKER_MAP[tracker_cfg.tracker_type](args=tracker_cfg, frame_rate=frame_rate) for frame_rate in frame_rates]
+
+
+
+# Function to detect people in frames of several streams with a single batched inference call,
+# then update the tracker of each stream. Returns (frame, boxes, track_ids, confidences) per frame
+def track_batch(model, trackers, frames, track_cfg):
+    predict_cfg = {key: value for key, value in track_cfg.items() if key != 'tracker'}
+    predict_cfg['conf'] = predict_cfg.get('conf') or 0.1 # Same default confidence as YOLO's track()
+    results = model.predict(frames, verbose = False, **predict_cfg)
+    detections = []
+    for frame, result, tracker in zip(frames, results, trackers):
+        tracks = tracker.update(result.boxes.cpu().numpy(), frame) if len(result.boxes) else []
+        if len(tracks) == 0: # No tracked objects in the frame
+            detections.append((frame, np.empty((0, 4), dtype=np.float32), [], np.empty(0, dtype=np.float32)))
+            continue
+        tracks = np.asarray(tracks, dtype=np.float32) # Rows of (x1, y1, x2, y2, id, conf, cls, idx)
+        boxes = np.stack(((tracks[:, 0] + tracks[:, 2]) / 2, (tracks[:, 1] + tracks[:, 3]) / 2,
+                          tracks[:, 2] - tracks[:, 0], tracks[:, 3] - tracks[:, 1]), axis=1) # Convert to (x, y, w, h)
+        detections.append((frame, boxes, tracks[:, 4].astype(int).tolist(), tracks[:, 5]))
+    return detections
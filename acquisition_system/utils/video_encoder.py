@@ -0,0 +1,50 @@
+import threading
+import cv2
+from .pipeline import StageQueue, STOP
+from .profiler import get_profiler
+
+
+class VideoEncoder:
+    def __init__(self, path, fps, size, scale = 1.0, output_fps = None, queue_size = 32, policy = 'block'):
+        # cv2.VideoWriter owned by a dedicated thread, fed through a bounded queue (same interface: write/release).
+        # The video can be downscaled ('scale') and/or written at a lower frame rate ('output_fps')
+        if not 0 < scale <= 1:
+            raise ValueError("Value of 'scale' must be in ]0, 1].")
+        width, height = size
+        self.size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        self.stride = max(round(fps / output_fps), 1) if output_fps else 1 # Only one of every 'stride' frames is written
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps / self.stride, self.size)
+        self.queue = StageQueue(queue_size, policy) # 'drop_oldest' never blocks the caller, dropping frames instead
+        self.received = 0
+        self.written = 0
+        self.max_queued = 0
+        self.thread = threading.Thread(target=self.run, name='encode', daemon=True)
+        self.thread.start()
+
+
+    def write(self, frame):
+        # Queue a frame to be encoded (the frame must not be modified afterwards)
+        self.received += 1
+        if (self.received - 1) % self.stride:
+            return # Skipped to reduce the frame rate
+        self.queue.put(frame)
+        self.max_queued = max(self.max_queued, self.queue.qsize())
+
+
+    def run(self):
+        profiler = get_profiler()
+        while (frame := self.queue.get()) is not STOP:
+            with profiler.timer('encode'):
+                if frame.shape[1::-1] != self.size:
+                    frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+                self.writer.write(frame)
+            self.written += 1
+
+
+    def release(self):
+        # Encode every queued frame, close the video and return the encoding statistics
+        self.queue.put(STOP)
+        self.thread.join()
+        self.writer.release()
+        return {"received": self.received, "written": self.written, "dropped": self.queue.dropped,
+                "skipped": self.received - self.written - self.queue.dropped, "max_queued": self.max_queued}
@@ -1,14 +1,28 @@
 import argparse
 from ultralytics import YOLO
 import os
+import importlib.util
+import cv2
+import json
+import time
 import yaml
+import torch
+import numpy as np
 
 
 parser = argparse.ArgumentParser(description='Main program for object detector.')
-parser.add_argument('--phase', default='train', choices=['train', 'test'], help="choose train or test phase")
+parser.add_argument('--phase', default='train', choices=['train', 'test', 'export', 'benchmark'], help="choose train, test, export or benchmark phase")
 opt = parser.parse_args()
 
 
+# Paths of the exported models are shared with the acquisition system, which loads them (only that module is loaded)
+spec = importlib.util.spec_from_file_location('exported_models', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                              'acquisition_system', 'utils', 'exported_models.py'))
+exported_models = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(exported_models)
+EXPORTED_MODELS, get_exported_path = exported_models.EXPORTED_MODELS, exported_models.get_exported_path
+
+
 
 def load_config(config_path):
     with open(config_path, 'r') as file:
@@ -17,16 +31,103 @@ def load_config(config_path):
 
 
 
+def get_size(path):
+    # Size (MB) of a model file or directory
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files) / 2**20
+    return os.path.getsize(path) / 2**20
+
+
+
+def read_frames(source, num_frames):
+    # First 'num_frames' frames of a video
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < num_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from {source}.")
+    return frames
+
+
+
+def measure_speed(model, frames, warmup, predict_cfg):
+    # Frames per second and latency percentiles (ms) of the prediction of one frame at a time
+    for frame in frames[:warmup]:
+        model.predict(frame, verbose = False, **predict_cfg)
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        model.predict(frame, verbose = False, **predict_cfg)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {"fps": round(len(frames) / (latencies.sum() / 1000), 1), "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2)}
+
+
+
 if __name__ == '__main__':
     cfg_path = os.path.abspath('object_detector/Yolo/Yolo.yaml')
     print(f"Loading {cfg_path} ...")
     cfg = load_config(cfg_path)
+    weights = os.path.join(cfg['train_cfg']['project'], cfg['train_cfg']['name'], 'weights', 'best.pt')
 
-    training = (opt.phase == 'train')
-    if training:
+    if opt.phase == 'train':
         print('\n------------------------------- TRAIN -------------------------------\n')
         YOLO().train(**cfg['train_cfg'])
-    else:
+    elif opt.phase == 'test':
         print('\n------------------------------- EVALUATION -------------------------------\n')
-        model = YOLO(os.path.join(cfg['train_cfg']['project'], cfg['train_cfg']['name'], 'weights', 'best.pt'))
-        model.val(**cfg['val_cfg'])
\ No newline at end of file
+        model = YOLO(weights)
+        model.val(**cfg['val_cfg'])
+    elif opt.phase == 'export':
+        print('\n------------------------------- EXPORT -------------------------------\n')
+        export_cfg = {key: value for key, value in cfg['export_cfg'].items() if key != 'formats'}
+        for format in cfg['export_cfg']['formats']:
+            path = YOLO(weights).export(format = format, **export_cfg) # A new model for each format (exporting fuses its layers)
+            print(f"Exported '{format}' model: {path}")
+            model_format = 'openvino_int8' if format == 'openvino' and export_cfg.get('int8') else format
+            if model_format in EXPORTED_MODELS and os.path.abspath(path) != os.path.abspath(get_exported_path(weights, model_format)):
+                print(f"Warning: the acquisition system looks for the '{model_format}' model in {get_exported_path(weights, model_format)}")
+    else:
+        print('\n------------------------------- BENCHMARK -------------------------------\n')
+        benchmark_cfg = cfg['benchmark_cfg']
+        threads = benchmark_cfg['threads'] or (len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count())
+        torch.set_num_threads(threads)
+        frames = read_frames(benchmark_cfg['source'], benchmark_cfg['frames'])
+        predict_cfg = {"imgsz": benchmark_cfg['imgsz'], "device": benchmark_cfg['device'], "conf": cfg['val_cfg']['conf']}
+        results = {}
+        for format in benchmark_cfg['formats']:
+            path = get_exported_path(weights, format)
+            if not os.path.exists(path):
+                results[format] = {"error": f"model not found: {path}"}
+                print(f"{format}: model not found ({path}), skipped")
+                continue
+            model = YOLO(path, task = 'detect')
+            result = {"path": path, "size_mb": round(get_size(path), 1)}
+            if benchmark_cfg['accuracy']:
+                # Exported models with static shapes are validated one image at a time
+                val_cfg = {**cfg['val_cfg'], **predict_cfg, "batch": cfg['val_cfg']['batch'] if format == 'pytorch' else 1,
+                           "name": f"{cfg['val_cfg']['name']}_{format}", "plots": False}
+                metrics = model.val(**val_cfg)
+                result.update({"map50": round(float(metrics.box.map50), 4), "map50_95": round(float(metrics.box.map), 4)})
+            result.update(measure_speed(model, frames, benchmark_cfg['warmup'], predict_cfg))
+            results[format] = result
+
+        # Print and save the results
+        print(f"\n{'format':<16}{'size (MB)':>10}{'mAP50':>8}{'mAP50-95':>10}{'fps':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}   ({threads} threads, device {benchmark_cfg['device']})")
+        for format, result in results.items():
+            if "error" in result:
+                print(f"{format:<16}  {result['error']}")
+                continue
+            print(f"{format:<16}{result['size_mb']:>10.1f}{result.get('map50', float('nan')):>8.3f}{result.get('map50_95', float('nan')):>10.3f}"
+                  f"{result['fps']:>8.1f}{result['latency_p50_ms']:>10.2f}{result['latency_p95_ms']:>10.2f}")
+        output_path = "outputs/object_detector/benchmark/"
+        os.makedirs(output_path, exist_ok=True)
+        output_file = os.path.join(output_path, time.strftime('%Y-%m-%d-%H-%M-%S') + '.json')
+        with open(output_file, 'w') as f:
+            json.dump({"threads": threads, "benchmark_cfg": benchmark_cfg, "results": results}, f, indent=2)
+        print(f"Results saved in {output_file}")
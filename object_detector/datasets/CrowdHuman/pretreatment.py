@@ -3,11 +3,11 @@ import os
 from pathlib import Path
 import zipfile
 import json
-from PIL import Image
 import tqdm
 from multiprocessing import Pool
 from functools import partial
 import shutil
+import hashlib
 
 
 
@@ -18,45 +18,189 @@ def load_config(config_path):
 
 
 
-def process_image_with_annotation(annotation_data, output_path, filter_cfg, aux):
+def read_annotations(annotations_path):
+    """Streams an .odgt annotation file, yielding for each image its ID and only the fields needed by the filter:
+    the (fbox, vbox) pairs of the objects tagged as 'person'.
+    """
+
+    with open(annotations_path, "r") as annotations_file:
+        for line in annotations_file:
+            annotation = json.loads(line)
+            yield annotation['ID'], [(obj['fbox'], obj['vbox']) for obj in annotation['gtboxes'] if obj['tag'] == 'person']
+
+
+
+def content_hash(data):
+    """Short hash of JSON-serializable data (filtering configuration, annotations)."""
+
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+
+
+def load_manifest(manifest_path):
+    """Loads the manifest of a previous run as an ID-keyed dict of records (the last record of each image wins).
+    A partial last line, left by an interrupted run, is truncated, so that the records appended next start on their own line.
+    """
+
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb+") as manifest_file:
+            data = manifest_file.read()
+            data = data[:data.rfind(b'\n') + 1]
+            manifest_file.truncate(len(data))
+        for line in data.splitlines():
+            record = json.loads(line)
+            manifest[record['ID']] = record
+    return manifest
+
+
+
+def find_annotation(id, annotations, index):
+    """Returns the person boxes of an image, looked up in the ID-keyed index of the annotations already parsed.
+    If the image was not parsed yet, the annotation stream is read (and indexed) until it is found (None if missing).
+    """
+
+    if id in index:
+        return index[id]
+    for annotation_id, person_boxes in annotations:
+        index[annotation_id] = person_boxes
+        if annotation_id == id:
+            return person_boxes
+    return None
+
+
+
+def member_ranges(archive_path, members, annotations, index, manifest, cfg_hash, range_size):
+    """Splits the image members of an archive into contiguous ranges, yielding for each range the
+    (archive path, [(member, ID, person boxes, annotation hash, previous record), ...], number of members) task,
+    with the images that have annotations and were not processed yet with the same inputs and filtering configuration.
+    """
+
+    archive_name = os.path.basename(archive_path)
+    for start in range(0, len(members), range_size):
+        entries = []
+        for member, crc in members[start:start + range_size]:
+            id = os.path.splitext(os.path.basename(member))[0]
+            person_boxes = find_annotation(id, annotations, index)
+            if person_boxes is None:
+                continue
+            annotation_hash = content_hash(person_boxes)
+            record = manifest.get(id)
+            if record is not None and (record['archive'], record['crc'], record['annotation']) != (archive_name, crc, annotation_hash):
+                record = None # Inputs changed, the image is processed again
+            if record is not None and record['cfg'] == cfg_hash:
+                continue # Unchanged inputs and filtering configuration
+            entries.append((member, id, person_boxes, annotation_hash, record))
+        yield archive_path, entries, len(members[start:start + range_size])
+
+
+
+def jpeg_size(stream):
+    """Reads the JPEG markers of a stream until the frame header (SOF) and returns (width, height, header bytes read)."""
+
+    header = stream.read(2)
+    if header != b'\xff\xd8':
+        raise ValueError('Not a JPEG file.')
+    while True:
+        marker = stream.read(2)
+        header += marker
+        while marker[1:] == b'\xff': # Fill bytes before the marker code
+            marker = marker[1:] + stream.read(1)
+            header += marker[1:]
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError('Invalid JPEG marker.')
+        segment = stream.read(2)
+        header += segment
+        length = int.from_bytes(segment, 'big')
+        data = stream.read(length - 2)
+        header += data
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC): # Start Of Frame (not DHT, JPG or DAC)
+            return int.from_bytes(data[3:5], 'big'), int.from_bytes(data[1:3], 'big'), header
+
+
+
+def filter_annotations(person_boxes, width, height, filter_cfg):
     """Normalizes annotations, filters those that are full_body (fbox), 
     and those fbox that do not go beyond the image limits and respect the minimum occlusion threshold.
     """
 
-    id = annotation_data.get("ID")
-    image = Image.open(os.path.join(output_path, 'intermediate_stage', 'Images', id + '.jpg'))
-    width, height = image.size
     annotation_data_normalized = []
-    for obj in annotation_data['gtboxes']:
-        if obj['tag'] == 'person':
-            x_min_f, y_min_f, width_f, height_f = obj['fbox']
-            _, _, width_v, height_v = obj['vbox']
-            if (x_min_f >= 0) and (y_min_f >= 0) and (x_min_f + width_f <= width) and (y_min_f + height_f <= height):
-                if (width_f * height_f * filter_cfg['max_occlusion_ratio']) <= (width_v * height_v):
-                    x_center_norm = "{:.5f}".format((x_min_f + (width_f / 2)) / width)
-                    y_center_norm = "{:.5f}".format((y_min_f + (height_f / 2)) / height)
-                    width_norm =  "{:.5f}".format(width_f / width)
-                    height_norm = "{:.5f}".format(height_f / height)
-                    annotation_data_normalized.append('0 ' + str(x_center_norm) + ' ' + str(y_center_norm) + ' ' + str(width_norm) + ' ' + str(height_norm))
-    if annotation_data_normalized or filter_cfg['keep_images_without_annotations']:
-        set_Data = 'Validation' if aux else 'Train'
-        with open(os.path.join(output_path, 'labels', set_Data, id + '.txt'), 'w') as txt_file:
-            for box in annotation_data_normalized:
-                txt_file.write(f'{box}\n')
-        shutil.move(os.path.join(output_path, 'intermediate_stage', 'Images', id + '.jpg'), os.path.join(output_path, 'images', set_Data))
+    for fbox, vbox in person_boxes:
+        x_min_f, y_min_f, width_f, height_f = fbox
+        _, _, width_v, height_v = vbox
+        if (x_min_f >= 0) and (y_min_f >= 0) and (x_min_f + width_f <= width) and (y_min_f + height_f <= height):
+            if (width_f * height_f * filter_cfg['max_occlusion_ratio']) <= (width_v * height_v):
+                x_center_norm = "{:.5f}".format((x_min_f + (width_f / 2)) / width)
+                y_center_norm = "{:.5f}".format((y_min_f + (height_f / 2)) / height)
+                width_norm =  "{:.5f}".format(width_f / width)
+                height_norm = "{:.5f}".format(height_f / height)
+                annotation_data_normalized.append('0 ' + str(x_center_norm) + ' ' + str(y_center_norm) + ' ' + str(width_norm) + ' ' + str(height_norm))
+    return annotation_data_normalized
+
+
+
+archives = {} # Archives opened by each worker (one zip handle per archive and worker)
+
+def process_member_range(task, output_path, filter_cfg, cfg_hash, aux):
+    """Filters the images of a range of archive members, reading only their JPEG headers,
+    and writes the images (and labels) that are kept straight to their final location.
+    Images already processed with the same inputs (previous record) are not read again: only their labels
+    are regenerated, and their image is written or removed if the new filter keeps or drops them.
+    Returns the number of members of the range and the manifest records of the processed images.
+    """
+
+    archive_path, entries, num_members = task
+    if archive_path not in archives:
+        archives[archive_path] = zipfile.ZipFile(archive_path)
+    archive = archives[archive_path]
+    set_Data = 'Validation' if aux else 'Train'
+    records = []
+    for member, id, person_boxes, annotation_hash, record in entries:
+        image_path = os.path.join(output_path, 'images', set_Data, id + '.jpg')
+        label_path = os.path.join(output_path, 'labels', set_Data, id + '.txt')
+        image_file, header = None, b''
+        if record is not None:
+            width, height = record['width'], record['height']
+        else:
+            image_file = archive.open(member)
+            width, height, header = jpeg_size(image_file)
+        annotation_data_normalized = filter_annotations(person_boxes, width, height, filter_cfg)
+        kept = bool(annotation_data_normalized or filter_cfg['keep_images_without_annotations'])
+        if kept:
+            with open(label_path, 'w') as txt_file:
+                for box in annotation_data_normalized:
+                    txt_file.write(f'{box}\n')
+            if record is None or not record['kept'] or not os.path.exists(image_path):
+                if image_file is None:
+                    image_file = archive.open(member)
+                with open(image_path, 'wb') as output_file:
+                    output_file.write(header)
+                    shutil.copyfileobj(image_file, output_file) # Rest of the image, after the header already read
+        else:
+            for path in (image_path, label_path): # Kept by a previous run
+                if os.path.exists(path):
+                    os.remove(path)
+        if image_file is not None:
+            image_file.close()
+        records.append({"ID": id, "archive": os.path.basename(archive_path), "crc": archive.getinfo(member).CRC, "annotation": annotation_hash,
+                        "width": width, "height": height, "kept": kept, "cfg": cfg_hash})
+    return num_members, records
 
 
 
 def transform(base_path: Path, output_path: Path, filter_cfg: dict, workers=1) -> None:
     """Filters images and annotations from base_path to output_path using parallel workers.
+    Images are read directly from the archives, without extracting them. Every processed image is recorded in
+    a manifest (output_path/manifest.jsonl), so that a later run skips the images whose inputs and filtering
+    configuration are unchanged (e.g. to resume an interrupted run), and only regenerates the labels of the others.
     Args:
         base_path (Path): Path to the directory containing the archives.
-        output_path (Path): Path to the directory to extract the archives to.
+        output_path (Path): Path to the directory to write the processed dataset to.
         filter_cfg (dict): Configuration for filtering images/annotations.
         workers (int): Number of parallel workers to use.
     """
 
-    directories = ['images/Train', 'images/Validation', 'labels/Train', 'labels/Validation', 'intermediate_stage']
+    directories = ['images/Train', 'images/Validation', 'labels/Train', 'labels/Validation']
     os.makedirs(output_path, exist_ok=True)
     for directory in directories:
         os.makedirs(os.path.join(output_path, directory), exist_ok=True)
@@ -64,31 +208,36 @@ def transform(base_path: Path, output_path: Path, filter_cfg: dict, workers=1) -
     folder_names = [['CrowdHuman_train01.zip', 'CrowdHuman_train02.zip', 'CrowdHuman_train03.zip'], ['CrowdHuman_val.zip']]
     annotations_file_names = ['annotation_train.odgt', 'annotation_val.odgt']
 
-    for i, set_Data in enumerate(folder_names):
-        print('Reading ' + annotations_file_names[i] + '...')
-        annotations_data = []
-        with open(os.path.join(base_path, annotations_file_names[i]), "r") as annotations_file_name:
-            for line in annotations_file_name:
-                line_json = json.loads(line)
-                annotations_data.append(line_json)
-        for folder in set_Data:
-            print('Unzipping ' + folder + '...')
-            with open(os.path.join(base_path, folder), 'rb') as f:
-                z = zipfile.ZipFile(f)
-                z.extractall(os.path.join(output_path, 'intermediate_stage'))
-            ids = os.listdir(os.path.join(output_path, 'intermediate_stage', 'Images'))
-            print('Preprocessing ' + folder + '...')
-            tasks = []
-            for id in ids:
-                annotation_data = next((ann for ann in annotations_data if (ann.get('ID') + '.jpg') == id), None)
-                if annotation_data:
-                    tasks.append(annotation_data)   
-            progress = tqdm.tqdm(total=len(ids), desc='Preprocessing', unit='img')
-            with Pool(processes=workers) as pool:
-                for _ in pool.imap(partial(process_image_with_annotation, output_path = output_path, filter_cfg = filter_cfg, aux = i), tasks):
-                    progress.update(1)
-            progress.close()
-            shutil.rmtree(os.path.join(output_path, 'intermediate_stage', 'Images'))
+    manifest_path = os.path.join(output_path, 'manifest.jsonl')
+    manifest = load_manifest(manifest_path)
+    cfg_hash = content_hash(filter_cfg)
+
+    with Pool(processes=workers) as pool, open(manifest_path, 'a') as manifest_file:
+        for i, set_Data in enumerate(folder_names):
+            print('Reading ' + annotations_file_names[i] + '...')
+            annotations = read_annotations(os.path.join(base_path, annotations_file_names[i])) # Parsed once, while the first folder is processed
+            index = {} # ID-keyed index of the parsed annotations
+            for folder in set_Data:
+                print('Preprocessing ' + folder + '...')
+                archive_path = os.path.join(base_path, folder)
+                with zipfile.ZipFile(archive_path) as z:
+                    members = [(info.filename, info.CRC) for info in z.infolist() if not info.is_dir() and info.filename.lower().endswith('.jpg')]
+                range_size = max(1, min(256, len(members) // (workers * 8))) # Several ranges per worker, to balance the load
+                progress = tqdm.tqdm(total=len(members), desc='Preprocessing', unit='img')
+                tasks = member_ranges(archive_path, members, annotations, index, manifest, cfg_hash, range_size)
+                for num_members, records in pool.imap_unordered(partial(process_member_range, output_path = output_path, filter_cfg = filter_cfg, cfg_hash = cfg_hash, aux = i), tasks):
+                    for record in records:
+                        manifest[record['ID']] = record
+                        manifest_file.write(json.dumps(record) + '\n')
+                    manifest_file.flush() # Records are saved as soon as their images are written, to resume interrupted runs
+                    progress.update(num_members)
+                progress.close()
+
+    # Rewrite the manifest with only the last record of each image
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        for record in manifest.values():
+            manifest_file.write(json.dumps(record) + '\n')
+    os.replace(manifest_path + '.tmp', manifest_path)
     
     num_train_img = len(os.listdir(os.path.join(output_path, 'images', 'Train')))
     num_valid_img = len(os.listdir(os.path.join(output_path, 'images', 'Validation')))
@@ -105,12 +254,12 @@ def transform(base_path: Path, output_path: Path, filter_cfg: dict, workers=1) -
     print(f"| Final number of images in validation set: {num_valid_img}")
     print("-" * 70)
 
-    os.rmdir(os.path.join(output_path, 'intermediate_stage')) 
-
     print('\nUnzipping CrowdHuman_test.zip...')
-    with open(os.path.join(base_path, "CrowdHuman_test.zip"), 'rb') as f:
-        z = zipfile.ZipFile(f)
-        z.extractall(output_path)
+    with zipfile.ZipFile(os.path.join(base_path, "CrowdHuman_test.zip")) as z:
+        for info in z.infolist():
+            target = os.path.join(output_path, info.filename)
+            if not (os.path.isfile(target) and os.path.getsize(target) == info.file_size): # Already extracted by a previous run
+                z.extract(info, output_path)
     print(f"Number of images in testing set: {5018}")
     
 
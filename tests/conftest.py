@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The acquisition system modules import each other as top-level packages ('utils', 'classes'), as when run from acquisition_system/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'acquisition_system'))
@@ -0,0 +1,47 @@
+import os
+import sys
+import subprocess
+import pytest
+from utils import EXPORTED_MODELS, get_exported_path
+from main import select_model
+
+
+def test_exported_paths():
+    weights = 'outputs/train/weights/best.pt'
+    assert get_exported_path(weights, 'pytorch') == weights
+    assert get_exported_path(weights, 'onnx') == 'outputs/train/weights/best.onnx'
+    assert get_exported_path(weights, 'openvino_int8') == 'outputs/train/weights/best_int8_openvino_model'
+
+
+def test_auto_prefers_exported_models_on_cpu(tmp_path):
+    weights = str(tmp_path / 'best.pt')
+    open(weights, 'w').close()
+    assert select_model(weights, 'auto', cpu = True) == weights
+    for format in reversed(list(EXPORTED_MODELS)): # From the least to the most preferred
+        path = get_exported_path(weights, format)
+        (tmp_path / path).mkdir() if format.startswith('openvino') else open(path, 'w').close()
+        assert select_model(weights, 'auto', cpu = True) == path
+        assert select_model(weights, 'auto', cpu = False) == weights
+
+
+def test_explicit_format(tmp_path):
+    weights = str(tmp_path / 'best.pt')
+    open(get_exported_path(weights, 'onnx'), 'w').close()
+    assert select_model(weights, 'onnx') == get_exported_path(weights, 'onnx')
+    assert select_model(str(tmp_path / 'model.onnx'), 'openvino') == str(tmp_path / 'model.onnx') # Already an exported model
+    with pytest.raises(ValueError):
+        select_model(weights, 'torchscript')
+    with pytest.raises(ValueError):
+        select_model(weights, 'tflite')
+
+
+def test_exported_paths_load_alone():
+    # The exporter loads the module by its path, without the rest of the acquisition system or its dependencies
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'acquisition_system', 'utils', 'exported_models.py')
+    code = ("import importlib.util, sys\n"
+            f"spec = importlib.util.spec_from_file_location('exported_models', {path!r})\n"
+            "module = importlib.util.module_from_spec(spec)\n"
+            "spec.loader.exec_module(module)\n"
+            "print(module.get_exported_path('best.pt', 'onnx'), 'numpy' in sys.modules, 'utils' in sys.modules)")
+    output = subprocess.run([sys.executable, '-I', '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    assert output == ['best.onnx', 'False', 'False']
@@ -0,0 +1,35 @@
+import os
+import json
+import importlib.util
+import pytest
+
+pytest.importorskip('tqdm')
+pytest.importorskip('yaml')
+
+
+def load_pretreatment():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'object_detector', 'datasets', 'CrowdHuman', 'pretreatment.py')
+    spec = importlib.util.spec_from_file_location('pretreatment', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def record(id):
+    return {"ID": id, "archive": "CrowdHuman_train01.zip", "crc": 1, "annotation": "a", "width": 10, "height": 10, "kept": True, "cfg": "c"}
+
+
+def test_resume_after_torn_manifest_line(tmp_path):
+    pretreatment = load_pretreatment()
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+    with open(manifest_path, 'w') as manifest_file:
+        manifest_file.write(json.dumps(record('1')) + '\n' + json.dumps(record('2')) + '\n' + json.dumps(record('3'))[:40]) # Interrupted while writing
+
+    manifest = pretreatment.load_manifest(manifest_path)
+    assert list(manifest) == ['1', '2']
+    with open(manifest_path, 'a') as manifest_file: # As transform resumes
+        manifest_file.write(json.dumps(record('3')) + '\n')
+
+    manifest = pretreatment.load_manifest(manifest_path)
+    assert list(manifest) == ['1', '2', '3']
+    assert manifest['3'] == record('3')
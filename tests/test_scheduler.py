@@ -0,0 +1,173 @@
+import numpy as np
+import pytest
+from utils import DetectionScheduler
+from classes import SQAM
+from main import track_frame, flush_frames, accepts_input_size
+
+
+class FakeTensor(np.ndarray):
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+class FakeBoxes:
+    # Rows (x1, y1, x2, y2, id, conf, cls) of 'num' tracked objects, or the given rows
+    def __init__(self, num, rows = None):
+        rows = [[0, 0, 10, 20, i, 0.9, 0] for i in range(1, num + 1)] if rows is None else rows
+        self.id = np.arange(1, len(rows) + 1, dtype=np.float32) if rows else None
+        self.data = np.array(rows, dtype=np.float32).reshape(-1, 7).view(FakeTensor)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class FakeModel:
+    # Records the arguments of every call to track()
+    def __init__(self, detections):
+        self.detections = iter(detections)
+        self.calls = []
+
+    def track(self, frame, persist, **kwargs):
+        self.calls.append(kwargs)
+        return [type('Result', (), {"boxes": FakeBoxes(next(self.detections))})()]
+
+
+class FakeWalk:
+    # One person (ID 1) walking to the right through the frames ['enter', 'leave'), identified by their value
+    def __init__(self, enter, leave):
+        self.enter, self.leave = enter, leave
+        self.calls = []
+
+    def track(self, frame, persist, **kwargs):
+        index = int(frame[0, 0, 0])
+        self.calls.append(index)
+        rows = []
+        if self.enter <= index < self.leave:
+            x = 100 + 20 * (index - self.enter)
+            rows = [[x - 25, 425, x + 25, 575, 1, 0.9, 0]]
+        return [type('Result', (), {"boxes": FakeBoxes(0, rows)})()]
+
+
+def test_idle_stride_and_wake_up():
+    scheduler = DetectionScheduler(idle_after = 2, idle_stride = 3)
+    decisions = []
+    for frame, detections_num in enumerate([0, 0, 0, 0, 0, 0, 0, 0, 1, 0]):
+        overrides = scheduler.next_frame()
+        if overrides is None:
+            scheduler.defer(frame)
+            decisions.append(None)
+        else:
+            decisions.append(scheduler.observe(detections_num))
+    # Two empty frames make the scene idle: one of every 3 frames is detected, and the deferred frames are passed on without
+    # detections, until frame 8 detects something: the frames deferred before it are detected again, and then every frame
+    assert decisions == [([], False), ([], False), ([], False), None, None, ([3, 4], False), None, None, ([6, 7], True), ([], False)]
+    assert scheduler.stats() == {"full": 3, "idle": 2, "skipped": 2, "redetected": 3}
+    for frame in (10, 11): # Idle again
+        assert scheduler.next_frame() is not None and scheduler.observe(0) == ([], False)
+    assert scheduler.next_frame() is None
+    scheduler.defer(12)
+    assert scheduler.flush() == [12] and scheduler.stats()["skipped"] == 3 # The video ends
+
+
+def test_full_rate_while_tracked():
+    scheduler = DetectionScheduler(idle_after = 1, idle_stride = 4)
+    scheduler.observe(0)
+    scheduler.set_tracked(1)
+    assert all(scheduler.next_frame() is not None for _ in range(10))
+    scheduler.set_tracked(0)
+    assert scheduler.next_frame() is not None and scheduler.next_frame() is None
+
+
+def test_imgsz_reaches_the_detector():
+    # Idle frames are detected at 'idle_imgsz'; the first one with detections is detected again at the full size
+    scheduler = DetectionScheduler(idle_after = 1, idle_stride = 1, idle_imgsz = 320, imgsz = 640)
+    model = FakeModel([0, 0, 2, 2, 0])
+    track_cfg = {"conf": 0.5}
+    results = [track_frame(model, track_cfg, np.zeros((4, 4, 3), dtype=np.uint8), scheduler) for _ in range(4)]
+    assert [call["imgsz"] for call in model.calls] == [640, 320, 320, 640, 640]
+    assert all(call["conf"] == 0.5 for call in model.calls)
+    assert [len(result) for result in results] == [1, 1, 1, 1]
+    assert results[2][0][2] == [1, 2]
+
+
+def test_keep_size():
+    scheduler = DetectionScheduler(idle_after = 1, idle_imgsz = 320)
+    scheduler.keep_size()
+    model = FakeModel([0, 0])
+    for _ in range(2):
+        track_frame(model, {"imgsz": 640}, np.zeros((4, 4, 3), dtype=np.uint8), scheduler)
+    assert [call["imgsz"] for call in model.calls] == [640, 640]
+
+
+def test_entry_on_a_deferred_frame():
+    # A person enters an idle scene on a deferred frame and walks for exactly two sequences of 'n' frames:
+    # both are complete, as without the scheduler
+    n, enter = 20, 9
+    model = FakeWalk(enter, enter + 2 * n)
+    scheduler = DetectionScheduler(idle_after = 2, idle_stride = 5, idle_imgsz = 320, imgsz = 640)
+    sqam = SQAM(1080, 1920, n = n, p = 5, x = 5, t = 2)
+    analysed, sequences = [], []
+    frames = [np.full((4, 4, 3), index, dtype=np.uint8) for index in range(enter + 2 * n + 10)]
+    for frame in frames:
+        for detections in track_frame(model, {}, frame, scheduler):
+            analysed.append(int(detections[0][0, 0, 0]))
+            sqam.process_new_frame(detections[0], detections[1], detections[2].copy())
+            scheduler.set_tracked(len(sqam.tracks.slots))
+            sequences.extend(sqam.complete_sequence_dict)
+    analysed.extend(int(detections[0][0, 0, 0]) for detections in flush_frames(scheduler))
+    assert analysed == list(range(len(frames))) # Every frame reaches SQAM once, in order
+    assert model.calls[:13] == [0, 1, 2, 7, 12, 8, 9, 10, 11, 12, 13, 14, 15] # Frames 8 to 11 deferred, then detected again with 12
+    assert [(sequence["frames_tracked"], sequence["first_position"][0]) for sequence in sequences] == [(n, 100), (n, 100 + 20 * n)]
+    assert scheduler.stats()["redetected"] == 5
+
+
+def test_tracker_rewound_before_detecting_again():
+    # The tracker state of the idle frame that detected something is discarded: the tracker sees every frame once, in order
+    cv2 = pytest.importorskip('cv2')
+    tracker = type('Tracker', (), {})()
+    tracker.frames, tracker.encoder = [], object()
+    tracker.gmc = type('GMC', (), {})()
+    tracker.gmc.detector = cv2.FastFeatureDetector_create(20) # Cannot be copied
+    encoder, detector = tracker.encoder, tracker.gmc.detector
+    model = FakeWalk(6, 20)
+    model.predictor = type('Predictor', (), {"trackers": [tracker]})()
+    track = model.track
+    def track_and_update(frame, persist, **kwargs):
+        model.predictor.trackers[0].frames.append(int(frame[0, 0, 0]))
+        return track(frame, persist, **kwargs)
+    model.track = track_and_update
+    scheduler = DetectionScheduler(idle_after = 1, idle_stride = 3)
+    for index in range(10):
+        track_frame(model, {}, np.full((4, 4, 3), index, dtype=np.uint8), scheduler)
+    restored = model.predictor.trackers[0]
+    assert model.calls == [0, 1, 4, 7, 5, 6, 7, 8, 9]
+    assert restored is not tracker and restored.frames == [0, 1, 4, 5, 6, 7, 8, 9]
+    assert restored.encoder is encoder and restored.gmc.detector is detector # Shared, not copied
+
+
+def test_accepts_input_size(tmp_path):
+    assert accepts_input_size('weights/best.pt')
+    for dynamic in (True, False):
+        openvino = tmp_path / f"dynamic_{dynamic}_openvino_model"
+        openvino.mkdir()
+        (openvino / 'metadata.yaml').write_text(f"imgsz: [640, 640]\nargs:\n  dynamic: {str(dynamic).lower()}\n  batch: 1\n")
+        assert accepts_input_size(str(openvino)) == dynamic
+    missing = tmp_path / "best_openvino_model"
+    missing.mkdir()
+    assert not accepts_input_size(str(missing)) # No metadata: assumed fixed
+    assert not accepts_input_size(str(tmp_path / "best.onnx"))
+
+
+def test_imgsz_reaches_the_ultralytics_predictor():
+    ultralytics = pytest.importorskip('ultralytics')
+    model = ultralytics.YOLO('yolo11n.yaml') # Untrained model, built without downloads
+    scheduler = DetectionScheduler(idle_after = 1, idle_stride = 1, idle_imgsz = 320, imgsz = 640)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    sizes = []
+    for _ in range(3):
+        track_frame(model, {"tracker": "bytetrack.yaml", "conf": 1.0, "verbose": False}, frame, scheduler) # Nothing detected
+        sizes.append(max(model.predictor.imgsz))
+    assert sizes == [640, 320, 320]
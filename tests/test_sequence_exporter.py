@@ -0,0 +1,40 @@
+import os
+import json
+import numpy as np
+from utils import SequenceExporter
+
+
+def export(output_path, person_ids, value):
+    exporter = SequenceExporter(output_path, 'npz', workers = 1)
+    for person_id in person_ids:
+        exporter.submit({"person_id": person_id, "angle": 0}, [np.full((4, 4, 3), value, dtype=np.uint8)] * 3)
+    return exporter.close()
+
+
+def read_index(output_path):
+    with open(os.path.join(output_path, 'index.jsonl')) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_runs_do_not_overwrite_each_other(tmp_path):
+    export(str(tmp_path), [3, 5], 1)
+    export(str(tmp_path), [3], 2)
+    entries = read_index(tmp_path)
+    assert [entry["sequence"] for entry in entries] == ["000001_3", "000002_5", "000003_3"]
+    for entry, value in zip(entries, [1, 1, 2]):
+        assert (np.load(os.path.join(tmp_path, entry["path"]))["frames"] == value).all()
+
+
+def test_partial_index_line_is_dropped(tmp_path):
+    export(str(tmp_path), [3], 1)
+    with open(os.path.join(tmp_path, 'index.jsonl'), 'a') as f:
+        f.write('{"sequence": "000002_4", "pa') # Interrupted write
+    export(str(tmp_path), [4], 2)
+    assert [entry["sequence"] for entry in read_index(tmp_path)] == ["000001_3", "000002_4"]
+
+
+def test_unindexed_artifacts_are_not_overwritten(tmp_path):
+    export(str(tmp_path), [3], 1)
+    np.savez_compressed(os.path.join(tmp_path, '000002_7.npz'), frames=np.zeros(1)) # Written before an interruption, not indexed
+    export(str(tmp_path), [3], 2)
+    assert read_index(tmp_path)[-1]["sequence"] == "000003_3"
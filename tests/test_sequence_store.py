@@ -0,0 +1,38 @@
+import os
+import numpy as np
+from utils import SequenceStore, SequenceStoreWriter
+
+
+SHAPE = (3, 4, 5, 3)
+
+
+def sequence(person_id):
+    return {"person_id": person_id, "start_frame": person_id * 10, "end_frame": person_id * 10 + 2, "timestamp": 1.5 * person_id,
+            "angle": person_id, "first_position": [1, 2], "last_position": [3, 4]}
+
+
+def write(path, person_ids, segment_size = 256):
+    writer = SequenceStoreWriter(str(path), SHAPE, segment_size = segment_size)
+    for person_id in person_ids:
+        writer.append(sequence(person_id), np.full(SHAPE, person_id, dtype=np.uint8))
+    writer.close()
+
+
+def test_append_across_runs_and_segments(tmp_path):
+    write(tmp_path, [1, 2, 3], segment_size = 2)
+    write(tmp_path, [4, 5], segment_size = 2)
+    store = SequenceStore(str(tmp_path))
+    assert len(store) == 5
+    for i in range(5):
+        assert (store.sequence(i) == i + 1).all()
+
+
+def test_partial_index_record_is_dropped(tmp_path):
+    write(tmp_path, [1, 2])
+    with open(os.path.join(tmp_path, 'index.bin'), 'ab') as f:
+        f.write(b'\x01' * 7) # Record interrupted while being written
+    write(tmp_path, [3])
+    store = SequenceStore(str(tmp_path))
+    assert len(store) == 3
+    assert [int(store.index[i]['person_id']) for i in range(3)] == [1, 2, 3]
+    assert (store.sequence(2) == 3).all()
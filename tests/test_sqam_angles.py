@@ -0,0 +1,73 @@
+import math
+import numpy as np
+import pytest
+from classes import SQAM
+
+
+HEIGHT, WIDTH = 1080, 1920
+
+
+def check(sqam, slopes, midpoints, start_y, end_y):
+    angles = sqam.get_angles(slopes, midpoints, start_y, end_y)
+    references = [sqam.get_angle(slope, midpoint, start, end) for slope, midpoint, start, end in zip(slopes, midpoints, start_y, end_y)]
+    assert angles.tolist() == references
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_trajectories(seed):
+    rng = np.random.default_rng(seed)
+    sqam = SQAM(HEIGHT, WIDTH, camera_dist = int(rng.integers(100, 2000)))
+    num = 2000
+    slopes = np.concatenate((rng.normal(0, 2, num // 2), rng.standard_cauchy(num // 2) * 10))
+    midpoints = np.column_stack((rng.integers(0, WIDTH, num), rng.integers(0, HEIGHT, num)))
+    start_y = rng.integers(0, HEIGHT, num)
+    end_y = start_y + rng.choice([-1, 1], num) * rng.integers(1, 300, num)
+    check(sqam, slopes, midpoints, start_y, end_y)
+
+
+def test_vertical_and_horizontal_trendlines():
+    sqam = SQAM(HEIGHT, WIDTH)
+    midpoints = np.array([[x, y] for x in (100, 700, 959, 961, 1500) for y in (100, 500, 1000)] * 2)
+    num = len(midpoints)
+    for slope in (999999, 0):
+        slopes = np.full(num, slope, dtype=np.float64)
+        start_y = np.full(num, 500)
+        end_y = np.where(np.arange(num) < num // 2, 600, 400) # Walking down and up
+        check(sqam, slopes, midpoints, start_y, end_y)
+
+
+def test_midpoint_on_the_camera_axis():
+    # Vertical reference vector: 0 when walking down, 180 when walking up, whatever the trendline
+    sqam = SQAM(HEIGHT, WIDTH)
+    midpoints = np.array([[WIDTH // 2, 300]] * 4)
+    slopes = np.array([1.5, -1.5, 999999, 0])
+    angles = sqam.get_angles(slopes, midpoints, [100, 500, 100, 500], [500, 100, 500, 100])
+    assert angles.tolist() == [0, 180, 0, 180]
+    check(sqam, slopes, midpoints, [100, 500, 100, 500], [500, 100, 500, 100])
+
+
+def test_trendlines_parallel_to_the_camera_direction():
+    # Angles at the 0/180 boundary, where acos and atan2 differ by a few ulps
+    sqam = SQAM(HEIGHT, WIDTH)
+    rng = np.random.default_rng(0)
+    midpoints = np.column_stack((rng.integers(0, WIDTH, 500), rng.integers(0, HEIGHT, 500)))
+    midpoints = midpoints[midpoints[:, 0] != WIDTH // 2]
+    camera = np.array([WIDTH // 2, HEIGHT + sqam.camera_dist])
+    slopes = (camera[1] - midpoints[:, 1]) / (camera[0] - midpoints[:, 0])
+    for start_y, end_y in ((100, 900), (900, 100)):
+        num = len(midpoints)
+        check(sqam, slopes, midpoints, np.full(num, start_y), np.full(num, end_y))
+        for offset in (1e-12, -1e-12, 1e-7, -1e-7):
+            check(sqam, slopes * (1 + offset), midpoints, np.full(num, start_y), np.full(num, end_y))
+
+
+def test_angles_near_integers():
+    # Trendlines whose angle with the camera direction is within 1e-4 degrees of an integer
+    sqam = SQAM(HEIGHT, WIDTH)
+    midpoint = np.array([400, 600])
+    camera = np.array([WIDTH // 2, HEIGHT + sqam.camera_dist])
+    base = math.atan2(camera[1] - midpoint[1], camera[0] - midpoint[0])
+    slopes = np.array([math.tan(base + math.radians(degrees + delta)) for degrees in range(1, 180) for delta in (-1e-6, 0, 1e-6)])
+    num = len(slopes)
+    for start_y, end_y in ((100, 900), (900, 100)):
+        check(sqam, slopes, np.tile(midpoint, (num, 1)), np.full(num, start_y), np.full(num, end_y))
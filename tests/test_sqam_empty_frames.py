@@ -0,0 +1,31 @@
+import numpy as np
+from classes import SQAM
+
+
+HEIGHT, WIDTH = 1080, 1920
+EMPTY = {"detections_num": 0, "new_entries": 0, "exclusions_num": 0, "valid_sequence_num": 0, "num_max_frames": 0}
+
+
+def fail(slots):
+    raise AssertionError("checks run on an empty frame")
+
+
+def test_empty_frames_skip_the_checks(monkeypatch):
+    sqam = SQAM(HEIGHT, WIDTH)
+    monkeypatch.setattr(sqam, 'check_direction_changes', fail)
+    frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    for _ in range(3):
+        sqam.process_new_frame(frame, np.empty((0, 4)), [])
+        assert sqam.tracking_dict == EMPTY
+    assert sqam.num_frames == 3
+    assert sqam.last_frames.count == 0 # Frames without anyone tracked are not kept
+
+
+def test_empty_frame_ends_the_tracked_people():
+    sqam = SQAM(HEIGHT, WIDTH)
+    sqam.process_new_frame(None, np.array([[100, 500, 50, 150], [900, 500, 50, 150]]), [1, 2])
+    assert sqam.tracking_dict["new_entries"] == 2
+    sqam.process_new_frame(None, np.empty((0, 4)), [])
+    assert sqam.tracking_dict == {**EMPTY, "exclusions_num": 2}
+    assert [exclusion["reason"] for exclusion in sqam.exclusion_dict] == ["Tracking Discontinuity"] * 2
+    assert not sqam.tracks.slots
@@ -0,0 +1,78 @@
+import warnings
+import numpy as np
+import pytest
+from classes.track_store import TrackStore
+
+PCA = pytest.importorskip('sklearn.decomposition').PCA
+
+
+def pca_trendline(positions):
+    # Trendline of the previous implementation (principal direction of the positions with scikit-learn's PCA)
+    mean = np.mean(positions, axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore') # Explained variance ratio of positions without variance
+        pca = PCA(n_components = 1).fit(positions - mean)
+    direction = pca.components_[0]
+    slope = 999999 if direction[0] == 0 else direction[1] / direction[0]
+    return slope, mean[1] - slope * mean[0]
+
+
+def pca_has_variance(positions):
+    return np.var(positions[:, 0]) != 0 or np.var(positions[:, 1]) != 0
+
+
+def store_trendlines(histories):
+    # Trendline and variance of every history, through the columnar store
+    store = TrackStore(n = max(len(history) for history in histories), max_people = 4)
+    slots = []
+    for id, history in enumerate(histories):
+        store.add(id, history[0])
+        slots.append(store.slots[id])
+        for box in history[1:]:
+            store.add_positions(np.array([slots[-1]]), box.reshape(1, 4))
+    slots = np.array(slots)
+    store.calculate_trendline_coefficients(slots)
+    return store.trendline[slots], store.has_variance(slots)
+
+
+def boxes(positions):
+    positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+    return np.column_stack((positions, np.full((len(positions), 2), 100)))
+
+
+def check(histories):
+    trendlines, variances = store_trendlines(histories)
+    for history, (slope, intercept), variance in zip(histories, trendlines, variances):
+        positions = history[:, :2].astype(float)
+        expected_slope, expected_intercept = pca_trendline(positions)
+        assert slope == pytest.approx(expected_slope, rel = 1e-6, abs = 1e-9)
+        assert intercept == pytest.approx(expected_intercept, rel = 1e-6, abs = 1e-6)
+        assert variance == pca_has_variance(positions)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_walks(seed):
+    rng = np.random.default_rng(seed)
+    histories = []
+    for _ in range(20):
+        length = int(rng.integers(2, 76))
+        direction = rng.uniform(0, 2 * np.pi)
+        steps = rng.uniform(0, 8) * np.array([np.cos(direction), np.sin(direction)]) + rng.normal(0, rng.uniform(0, 3), (length, 2))
+        histories.append(boxes(rng.uniform(0, 1900, 2) + np.cumsum(steps, axis=0)))
+    check(histories)
+
+
+def test_vertical_history():
+    check([boxes([(500, y) for y in range(100, 400, 7)])])
+
+
+def test_horizontal_history():
+    check([boxes([(x, 300) for x in range(100, 400, 7)])])
+
+
+def test_single_point_history():
+    check([boxes([(500, 300)])])
+
+
+def test_history_without_variance():
+    check([boxes([(500, 300)] * 10)])
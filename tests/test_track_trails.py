@@ -0,0 +1,25 @@
+import numpy as np
+from utils import TrackTrails
+
+
+def test_trails():
+    trails = TrackTrails(length = 3, capacity = 2)
+    for frame in range(5):
+        trails.new_frame()
+        trail = trails.add(7, frame, 10 * frame)
+        trails.add(frame + 100, 0, 0) # New ID in every frame
+    assert trail.tolist() == [[2, 20], [3, 30], [4, 40]] # Last 'length' points, oldest first
+    trails.new_frame()
+    assert trails.add(7, 5, 50).tolist() == [[3, 30], [4, 40], [5, 50]]
+
+
+def test_capacity_stays_bounded():
+    # 1000 distinct IDs over time, each seen for 30 frames and 3 at once: the slots of the IDs no longer seen are reused
+    trails = TrackTrails(length = 30, capacity = 64)
+    for frame in range(10000):
+        trails.new_frame()
+        for track_id in range(frame // 10, frame // 10 + 3):
+            trails.add(track_id, frame, 0)
+        assert len(trails.slots) <= 3 + 2 * 30 // 10 + 1 # The IDs seen within the last 2 * 'max_age' frames, at most
+    assert len(trails.points) == 64 and len(trails.next) <= 10
+    assert trails.add(-1, 0, 0).tolist() == [[0, 0]] # A reused slot starts an empty trail